@@ -1,36 +1,97 @@
-from fastapi import FastAPI, Body, HTTPException, status, Depends, UploadFile, File, Form
-from fastapi.responses import Response
+from fastapi import FastAPI, Body, HTTPException, status, Depends, UploadFile, File, Form, Request
+from fastapi.responses import Response, StreamingResponse, FileResponse
 
 from src.config.creds import MONGODB_URL, ADMIN_USERNAME, SCRAPER_PSWD_HASH
 
 import motor.motor_asyncio
-from models import UserModel, UpdateUserModel, UserLoginModel, SbirRequest, SamRequest, DomainsRequest
+from models import UserModel, UpdateUserModel, UserLoginModel, SbirRequest, SamRequest, SearchRequest, DomainsRequest
 from bson import ObjectId
 from pymongo import ReturnDocument
 from pymongo.errors import DuplicateKeyError
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from src.utils.utlils import hash
-from typing import Annotated
+from src.utils.responses import compact_results, json_response
+from src.utils.auth import is_user, user_token
+from typing import Annotated, Optional
 from werkzeug.utils import secure_filename
 
 from src.services.rag.retriever import Retriever
 from src.services.rag.loader import Loader
 from src.services.scrapers.sbir import SbirScraper
 from src.services.scrapers.samgov import SamScraper
-from src.services.llm.llm import generate_rating, get_domains
-from src.config.config import COMPANY_DATA_QUERY
+from src.services.scrapers.unified import search_all
+from src.services.scrapers.index import opportunity_index, save_periodically
+from src.services.llm.llm import generate_rating
+from src.services.feeds.feeds import FeedScheduler, scrape_domains, stream_domains
+from src.services.governor.governor import governor
+from src.services.profiling.profiling import (PROFILE_MODES, activate, end_session, is_admin, list_profiles,
+                                              should_sample, start_session)
+from src.config.config import COMPANY_DATA_QUERY, FEED_PLATFORMS, CHUNKING_PROFILES, DEFAULT_CHUNKING_PROFILE, DATA_DIR, PROFILE_DIR
+from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
 import json
-
-
-app = FastAPI()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+import os
+import tempfile
 
 
 #MongoDB connection
 client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL)
 db = client.rfp_scraper
 users_collection = db.get_collection("users")
+feeds_collection = db.get_collection("feeds")
+feed_leases_collection = db.get_collection("feed_leases")
+
+feed_scheduler = FeedScheduler(users_collection, feeds_collection, feed_leases_collection)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    index = await asyncio.to_thread(opportunity_index)
+    index_saver = asyncio.create_task(save_periodically(index))
+    await feed_scheduler.start()
+    yield
+    await feed_scheduler.stop()
+    index_saver.cancel()
+    await asyncio.gather(index_saver, return_exceptions=True)
+    if index.dirty:
+        await asyncio.to_thread(index.save)
+
+
+app = FastAPI(lifespan=lifespan)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    # Admins profile a single request with the X-Profile header or ?profile= flag, other requests are sampled
+    admin = is_admin(request.headers.get("x-profile") or request.query_params.get("profile"))
+    if not admin and not should_sample():
+        return await call_next(request)
+
+    mode = request.headers.get("x-profile-mode", "sample")
+    session = start_session(f"{request.method} {request.url.path}", mode=mode if mode in PROFILE_MODES else "sample")
+    try:
+        with activate(session):
+            response = await call_next(request)
+    except Exception:
+        end_session(session)
+        raise
+
+    # Streaming endpoints keep working after the headers are sent, so the profile ends with the body
+    body_iterator = response.body_iterator
+
+    async def profiled_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            await asyncio.to_thread(end_session, session)
+
+    response.body_iterator = profiled_body()
+    if admin:
+        response.headers["X-Profile-Id"] = session.id
+    return response
 
 
 @app.get("/")
@@ -69,8 +130,10 @@ async def login(user_data: UserLoginModel):
             detail="Incorrect password",
         )
 
+    await users_collection.update_one({"_id": user["_id"]}, {"$set": {"last_active": datetime.utcnow()}})
+
     # User exists and password is correct
-    return {"message": "Login successful", "id": str(user["_id"]), "name": user["name"]}
+    return {"message": "Login successful", "id": str(user["_id"]), "name": user["name"], "token": user_token(str(user["_id"]))}
 
 
 @app.post("/signup", response_description="Add new user", response_model=None, response_model_by_alias=False)
@@ -107,6 +170,8 @@ async def create_user(user: UserModel = Body(...)):
 )
 async def update_user(id: str, user: UpdateUserModel = Body(...)):
     user = {k: v for k, v in user.model_dump(by_alias=True).items() if v is not None}
+    if "chunking_profile" in user and user["chunking_profile"] not in CHUNKING_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Invalid chunking profile, choose one of {list(CHUNKING_PROFILES)}")
     if len(user) >= 1:
         update_result = await users_collection.find_one_and_update({"_id": ObjectId(id)}, {"$set": user}, return_document=ReturnDocument.AFTER)
         if update_result is not None:
@@ -130,7 +195,7 @@ async def delete_user(id: str):
 
 
 @app.post("/upload_file")
-async def upload_file(user_id: str = Form(...) , file: UploadFile = File(...)):
+async def upload_file(user_id: str = Form(...) , file: UploadFile = File(...), chunking_profile: Optional[str] = Form(None)):
     
     #Sanity check
     user_id = secure_filename(user_id)
@@ -138,6 +203,15 @@ async def upload_file(user_id: str = Form(...) , file: UploadFile = File(...)):
     if user_id == '' or user_id is None:
         raise HTTPException(status_code=400, detail="Corrupted user id")
 
+    if chunking_profile is None and ObjectId.is_valid(user_id):
+        user = await users_collection.find_one({"_id": ObjectId(user_id)}, {"chunking_profile": 1})
+        if user:
+            chunking_profile = user.get("chunking_profile")
+    chunking_profile = chunking_profile or DEFAULT_CHUNKING_PROFILE
+
+    if chunking_profile not in CHUNKING_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Invalid chunking profile, choose one of {list(CHUNKING_PROFILES)}")
+
     if file:
         if not file.filename.endswith('.pdf'):
             raise HTTPException(status_code=402, detail="File must be a pdf")
@@ -146,20 +220,30 @@ async def upload_file(user_id: str = Form(...) , file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="No file provided")
  
 
-    with open(f"temp.pdf", "wb") as f:
+    # Each request gets its own temp file so concurrent uploads don't overwrite each other
+    upload_dir = os.path.join(DATA_DIR, "uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", dir=upload_dir, delete=False) as f:
         f.write(content)
+        temp_path = f.name
+
+    try:
+        loader = Loader()
+        docs = loader.load_document(temp_path)
+        # The temp path is random, record the uploaded file name instead
+        for doc in docs:
+            doc.metadata["source"] = doc.metadata["file_path"] = secure_filename(file.filename)
+        retriever = Retriever(user_id, profile=chunking_profile)
         
-    loader = Loader()
-    docs = loader.load_document("temp.pdf")
-    retriever = Retriever(user_id)
-    
-    retriever.add_documents(docs)
+        retriever.add_documents(docs)
+    finally:
+        os.remove(temp_path)
         
     return {"status": "Document uploaded successfully"}
 
 
 @app.get("/get-sbir")
-async def get_sbir(request: SbirRequest):
+async def get_sbir(request: SbirRequest, http_request: Request):
 
     #sanity check
     user_id = secure_filename(request.user_id)
@@ -174,11 +258,14 @@ async def get_sbir(request: SbirRequest):
         raise HTTPException(status_code=400, detail="Error in date format, please ensure date is in the format YYYY-MM-DD")
 
     scraper = SbirScraper(request.user_id)
-    return scraper.scrape(user_id=user_id, date_from=date_from, date_to=date_to, rate=request.rate)
+    results = scraper.scrape(user_id=user_id, date_from=date_from, date_to=date_to, rate=request.rate, mode=request.mode)
+    results = compact_results(results, fields=request.fields, description_length=request.description_length,
+                              limit=request.limit, offset=request.offset)
+    return json_response(results, http_request)
 
 
 @app.get("/get-sam")
-async def get_sam(request: SamRequest):
+async def get_sam(request: SamRequest, http_request: Request):
     
     #sanity check
     user_id = secure_filename(request.user_id)
@@ -186,9 +273,44 @@ async def get_sam(request: SamRequest):
     if user_id == '' or user_id is None:
         raise HTTPException(status_code=400, detail="Corrupted user id")
 
+    date_from = date_to = None
+    if request.date_from and request.date_to:
+        try:
+            date_from = datetime.strptime(str(request.date_from), '%Y-%m-%d %H:%M:%S')
+            date_to = datetime.strptime(str(request.date_to), '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Error in date format, please ensure date is in the format YYYY-MM-DD HH:MM:SS")
+
     scraper = SamScraper(user_id)
-    return scraper.scrape(user_id, request.rate)
+    results = scraper.scrape(user_id, rate=request.rate, date_from=date_from, date_to=date_to, mode=request.mode)
+    results = compact_results(results, fields=request.fields, description_length=request.description_length,
+                              limit=request.limit, offset=request.offset, sort=request.rate)
+    return json_response(results, http_request)
+
+
 
+@app.get("/search")
+async def search(request: SearchRequest, http_request: Request):
+
+    #sanity check
+    user_id = secure_filename(request.user_id)
+
+    if user_id == '' or user_id is None:
+        raise HTTPException(status_code=400, detail="Corrupted user id")
+
+    date_from = date_to = None
+    if request.date_from and request.date_to:
+        try:
+            date_from = datetime.strptime(str(request.date_from), '%Y-%m-%d %H:%M:%S')
+            date_to = datetime.strptime(str(request.date_to), '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Error in date format, please ensure date is in the format YYYY-MM-DD HH:MM:SS")
+
+    results = await asyncio.to_thread(search_all, user_id, keywords=request.keywords, date_from=date_from,
+                                      date_to=date_to, top_k=request.top_k, mode=request.mode)
+    results = compact_results(results, fields=request.fields, description_length=request.description_length,
+                              limit=request.limit, offset=request.offset)
+    return json_response(results, http_request)
 
 
 @app.post("/get-rating")
@@ -219,17 +341,7 @@ async def get_domain(request: DomainsRequest):
         raise HTTPException(status_code=400, detail="Invalid platform")
     
     try:
-        domains = get_domains(company_data=scraper.docs)
-        
-        results = {}
-        
-        for domain in domains.keys():
-            temp_res = {}
-            for domain_name in domains[domain]:
-                print(f"Scraping {domain_name}...")
-                temp_res[domain_name] = scraper.scrape(user_id=request.user_id, keywords=domain_name, rate=True)
-            results[domain] = temp_res
-        return results
+        return scrape_domains(scraper, request.user_id)
     
     
     # with open("temp.json", "r") as f:
@@ -239,7 +351,82 @@ async def get_domain(request: DomainsRequest):
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
-    
-    
-    
\ No newline at end of file
+
+
+@app.get("/get-domain/stream")
+async def get_domain_stream(user_id: str, platform: str, http_request: Request):
+
+    #sanity check
+    user_id = secure_filename(user_id)
+
+    if user_id == '' or user_id is None:
+        raise HTTPException(status_code=400, detail="Corrupted user id")
+
+    # Query parameters rather than a JSON body, since EventSource can't send a body with GET
+    if platform == "sbir.gov":
+        scraper = await asyncio.to_thread(SbirScraper, user_id)
+    elif platform == "sam.gov":
+        scraper = await asyncio.to_thread(SamScraper, user_id)
+    else:
+        raise HTTPException(status_code=400, detail="Invalid platform")
+
+    return StreamingResponse(
+        stream_domains(scraper, user_id, http_request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/feed/{user_id}")
+async def get_feed(user_id: str, platform: str, http_request: Request, token: Annotated[str, Depends(oauth2_scheme)]):
+
+    #sanity check
+    user_id = secure_filename(user_id)
+
+    if user_id == '' or user_id is None:
+        raise HTTPException(status_code=400, detail="Corrupted user id")
+
+    # Reading a stale feed triggers a rebuild, so only the user may read it
+    if not is_user(user_id, token):
+        raise HTTPException(status_code=403, detail="Not allowed to read this feed")
+
+    if platform not in FEED_PLATFORMS:
+        raise HTTPException(status_code=400, detail="Invalid platform")
+
+    feed = await feed_scheduler.get_feed(user_id, platform)
+    if feed is None:
+        return Response(status_code=status.HTTP_202_ACCEPTED)
+
+    return json_response(feed, http_request)
+
+
+@app.get("/governor")
+async def get_governor():
+    return governor.state()
+
+
+@app.get("/profiles")
+async def get_profiles(http_request: Request, limit: int = 50):
+
+    if not is_admin(http_request.headers.get("x-profile") or http_request.query_params.get("profile")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+    return await asyncio.to_thread(list_profiles, limit=limit)
+
+
+@app.get("/profiles/{profile_id}/{kind}")
+async def get_profile_file(profile_id: str, kind: str, http_request: Request):
+
+    if not is_admin(http_request.headers.get("x-profile") or http_request.query_params.get("profile")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+    profile_id = secure_filename(profile_id)
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json")) as f:
+            files = json.load(f)["files"]
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if kind not in files:
+        raise HTTPException(status_code=404, detail="Profile file not found")
+    return FileResponse(os.path.join(PROFILE_DIR, files[kind]))
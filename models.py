@@ -1,5 +1,5 @@
 from pydantic import ConfigDict, BaseModel, Field, EmailStr
-from typing import Optional
+from typing import Optional, List, Literal
 
 class UserModel(BaseModel):
     name: str
@@ -24,6 +24,7 @@ class UpdateUserModel(BaseModel):
     name: Optional[str] = None
     email: Optional[str] = None
     password: Optional[str] = None
+    chunking_profile: Optional[str] = None
     
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
@@ -44,17 +45,37 @@ class UserLoginModel(BaseModel):
     password: str
     
 
-class SbirRequest(BaseModel):
+class ResultsRequest(BaseModel):
+    fields: Optional[List[str]] = None
+    description_length: Optional[int] = Field(default=None, ge=0)
+    limit: Optional[int] = Field(default=None, ge=0)
+    offset: int = Field(default=0, ge=0)
+
+
+class SbirRequest(ResultsRequest):
     user_id: str
     date_from: str
     date_to: str
     rate: bool
+    mode: Literal["remote", "local"] = "remote"
 
-class SamRequest(BaseModel):
+class SamRequest(ResultsRequest):
     user_id: str
     rate: bool
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    mode: Literal["remote", "local"] = "remote"
     
     
+class SearchRequest(ResultsRequest):
+    user_id: str
+    keywords: Optional[str] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    top_k: int = Field(default=100, ge=1)
+    mode: Literal["remote", "local"] = "remote"
+
+
 class DomainsRequest(BaseModel):
     user_id: str
     platform: str
\ No newline at end of file
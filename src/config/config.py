@@ -1,9 +1,118 @@
+import os
+
 # LLM Configuration
 
 ENGINE = 'gpt-4-turbo-2024-04-09' # gpt-4 gpt-3.5-turbo
 temperature = 0
 
 COMPANY_DATA_QUERY = "Overview, company description"
+# Views of the company retrieved together to extract its domains
+COMPANY_VIEW_QUERIES = [
+    COMPANY_DATA_QUERY,
+    "Capabilities, products and services",
+    "Past performance, contracts and customers",
+]
 
 PARENT_CHUNK_SIZE = 2000
 CHILD_CHUNK_SIZE = 200
+
+# Chunking profiles, sizes are in characters or in tokens of TOKEN_ENCODING depending on the mode.
+# An overlap of None keeps the splitter's default.
+TOKEN_ENCODING = "cl100k_base"
+CHUNKING_PROFILES = {
+    "characters": {"mode": "characters", "parent_size": PARENT_CHUNK_SIZE, "child_size": CHILD_CHUNK_SIZE, "overlap": None},
+    "tokens": {"mode": "tokens", "parent_size": 512, "child_size": 128, "overlap": 16},
+    "tokens-large": {"mode": "tokens", "parent_size": 1024, "child_size": 256, "overlap": 32},
+}
+DEFAULT_CHUNKING_PROFILE = "characters"
+
+# Ingest pipeline
+EMBED_BATCH_SIZE = 256 # child chunks per embedding request
+EMBED_CONCURRENCY = 4 # embedding requests in flight
+UPSERT_BATCH_SIZE = 100 # vectors per upsert request
+UPSERT_CONCURRENCY = 4 # upsert requests in flight
+
+
+# Response Configuration
+
+COMPRESSION_MIN_SIZE = 1024 # bytes, smaller payloads are sent uncompressed
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+# Feed Configuration
+
+FEED_PLATFORMS = ["sbir.gov", "sam.gov"]
+FEED_REFRESH_INTERVAL = 6 * 60 * 60 # seconds between scheduled rebuilds
+FEED_MAX_STALENESS = 12 * 60 * 60 # seconds before a read triggers a rebuild
+FEED_JITTER = 5 * 60 # maximum random delay in seconds before each rebuild
+FEED_CONCURRENCY = 2 # rebuilds running at the same time
+FEED_ACTIVE_DAYS = 14 # users seen within this many days get scheduled rebuilds
+FEED_MAX_RESULTS = 500 # results stored per feed
+FEED_MIN_INTERVAL = FEED_REFRESH_INTERVAL // 2 # seconds after a rebuild before any worker rebuilds the feed again
+FEED_LEASE = 60 * 60 # seconds a worker holds a rebuild before another may take it over
+FEED_RETRY_COOLDOWN = 10 * 60 # seconds before a failed rebuild is retried, doubled on every consecutive failure
+FEED_RETRY_COOLDOWN_MAX = 12 * 60 * 60
+
+
+# Query Configuration
+
+TERM_CACHE_TTL = 60 * 60 # seconds a fetched search term stays cached
+TERM_CACHE_SIZE = 256 # search terms cached per process
+TERM_FETCH_WORKERS = 4 # search terms fetched at the same time
+SBIR_PAGE_WORKERS = 4 # sbir.gov result pages fetched at the same time when a date range allows stopping early
+SAM_PAGE_SIZE = 1000 # sam.gov results requested per page
+SAM_MAX_RESULTS = 10000 # sam.gov results read per search term at most
+
+
+# Deduplication Configuration
+
+DEDUP_SHINGLE_SIZE = 3 # words per shingle
+DEDUP_NUM_PERM = 64 # MinHash permutations, split evenly into bands
+DEDUP_BANDS = 16
+DEDUP_THRESHOLD = 0.8 # estimated Jaccard similarity for two listings to be near-duplicates
+
+
+# Outbound Call Configuration
+
+GOVERNOR_INITIAL_LIMIT = 4 # concurrent calls per host before any feedback
+GOVERNOR_MIN_LIMIT = 1
+GOVERNOR_MAX_LIMIT = 32
+GOVERNOR_LATENCY_TARGET = 10 # seconds, slower calls shrink the limit
+GOVERNOR_DECREASE_FACTOR = 0.5
+GOVERNOR_RETRIES = 3
+GOVERNOR_BACKOFF_BASE = 0.5 # seconds, doubled on every retry before jitter
+GOVERNOR_BACKOFF_MAX = 30
+GOVERNOR_FAILURE_THRESHOLD = 5 # consecutive failures that open the circuit
+GOVERNOR_COOLDOWN = 60 # seconds an open circuit fails fast before probing again
+GOVERNOR_TIMEOUT = 60 # seconds per HTTP request
+
+
+# Storage Configuration
+
+DATA_DIR = os.getenv("RFP_DATA_DIR", "/var/lib/rfp-scraper") # per-user docstores, checkpoints and upload temp files
+DOCSTORE_BACKEND = os.getenv("RFP_DOCSTORE_BACKEND", "file") # "file" for DATA_DIR, "mongodb" to share across nodes
+VECTOR_STORE_BACKEND = os.getenv("RFP_VECTOR_STORE_BACKEND", "pinecone") # "pinecone", or "memory" for local runs
+EMBEDDINGS_BACKEND = os.getenv("RFP_EMBEDDINGS_BACKEND", "openai") # "openai", or "hashing" to embed without any API
+
+
+# Local Index Configuration
+
+INDEX_PATH = os.path.join(DATA_DIR, "opportunities.npz") # BM25 index over every scraped opportunity
+INDEX_SAVE_INTERVAL = 5 * 60 # seconds between saves of a changed index
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+# Source Configuration
+
+SBIR_URL = os.getenv("RFP_SBIR_URL", "https://www.sbir.gov")
+SAM_URL = os.getenv("RFP_SAM_URL", "https://sam.gov")
+
+
+# Profiling Configuration
+
+PROFILE_DIR = os.getenv("RFP_PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+PROFILE_SAMPLE_RATE = float(os.getenv("RFP_PROFILE_SAMPLE_RATE", "0")) # fraction of requests profiled without a token
+PROFILE_SAMPLE_INTERVAL = 0.005 # seconds between stack samples
+PROFILE_KEEP = 200 # profiles kept before the oldest are deleted
@@ -9,3 +9,5 @@ PINECONE_ENVIRONMENT = os.getenv('PINECONE_ENVIRONMENT')
 MONGODB_URL = os.getenv('MONGODB_URL')
 ADMIN_USERNAME = os.getenv('ADMIN_USERNAME')
 SCRAPER_PSWD_HASH = os.getenv('SCRAPER_PSWD_HASH')
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+USER_TOKEN_SECRET = os.getenv('USER_TOKEN_SECRET')
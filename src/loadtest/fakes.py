@@ -0,0 +1,373 @@
+import base64
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+
+WORDS = ["technology", "construction", "research", "defense", "energy", "software", "manufacturing", "support",
+         "sensor", "autonomy", "materials", "analytics", "logistics", "medical", "space", "cyber"]
+
+# A route takes the parsed URL and the request body, and returns the status, content type and body
+Route = Callable[[object, bytes], Tuple[int, str, bytes]]
+
+
+class FakeServer:
+    """
+    Local HTTP server standing in for an external service, with a configurable response latency.
+
+    Routes are matched by method and path prefix, longest prefix first.
+    """
+
+    def __init__(self, routes: Dict[Tuple[str, str], Route], latency: float = 0.0, jitter: float = 0.5):
+        self.routes = sorted(routes.items(), key=lambda item: len(item[0][1]), reverse=True)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, content_type, payload = server.dispatch(method, self.path, body)
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, str, bytes]:
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+        url = urlparse(path)
+        for (route_method, prefix), route in self.routes:
+            if route_method == method and url.path.startswith(prefix):
+                return route(url, body)
+        return 404, "application/json", b'{"detail": "Not found"}'
+
+
+def _words(generator: random.Random, count: int) -> str:
+    return " ".join(generator.choices(WORDS, k=count))
+
+
+def sbir_routes(pages: int = 5, per_page: int = 10) -> Dict[Tuple[str, str], Route]:
+    """
+    Routes replaying sbir.gov current-topic search pages, ordered by close date.
+
+    Args:
+        pages (int): Result pages per search term.
+        per_page (int): Listings per page.
+
+    Returns:
+        Dict[Tuple[str, str], Route]: The routes.
+    """
+    prefix = "/sbirsearch/topic/current/"
+
+    def search(url, body):
+        term = unquote(unquote(url.path[len(prefix):]))
+        page = int(parse_qs(url.query).get("page", ["0"])[0])
+        generator = random.Random(f"sbir-{term}-{page}")
+        today = datetime.now()
+
+        items = []
+        for i in range(per_page):
+            index = page * per_page + i
+            close_date = today + timedelta(days=index)
+            items.append(
+                f'<li class="search-result"><h3 class="title">{term.title()} topic {index}: {_words(generator, 5)}</h3>'
+                f'<a href="/node/{zlib.crc32(term.encode())}-{index}">Details</a>'
+                f'<span class="solr-search-open-date">Open Date: {today:%m-%d-%Y}</span>'
+                f'<span class="solr-search-release-date">Release Date: {today:%m-%d-%Y}</span>'
+                f'<span class="solr-search-due-date">Due Date: {close_date:%m-%d-%Y}</span>'
+                f'<span class="solr-search-close-date">Close Date: {close_date:%m-%d-%Y}</span>'
+                f'<p class="search-snippet">{term} {_words(generator, 80)}</p></li>'
+            )
+
+        links = "".join(f'<li><a href="{url.path}?page={k}">{k + 1}</a></li>' for k in range(1, pages))
+        pagination = f'<ul class="pagination">{links}<li class="next">next</li><li>last</li></ul>' if pages > 1 else ""
+        html = f'<html><body><ul>{"".join(items)}</ul>{pagination}</body></html>'
+        return 200, "text/html", html.encode()
+
+    return {("GET", prefix): search}
+
+
+def sam_routes(total: int = 300) -> Dict[Tuple[str, str], Route]:
+    """
+    Routes replaying the sam.gov search API.
+
+    Args:
+        total (int): Results per search term before date filtering.
+
+    Returns:
+        Dict[Tuple[str, str], Route]: The routes.
+    """
+    def search(url, body):
+        params = parse_qs(url.query)
+        term = params.get("q", [""])[0].strip()
+        page = int(params.get("page", ["0"])[0])
+        size = int(params.get("size", ["10"])[0])
+        today = datetime.now()
+
+        results = []
+        for index in range(page * size, min((page + 1) * size, total)):
+            generator = random.Random(f"sam-{term}-{index}")
+            response_date = today + timedelta(days=index % 120)
+            date_from = params.get("response_date.from", [None])[0]
+            date_to = params.get("response_date.to", [None])[0]
+            if date_from and date_to and not date_from <= f"{response_date:%Y-%m-%d}" <= date_to:
+                continue
+            results.append({
+                "_id": f"{zlib.crc32(term.encode()):08x}{index:024x}",
+                "title": f"{term.title()} opportunity {index}: {_words(generator, 5)}",
+                "descriptions": [{"content": f"{term} {_words(generator, 120)}"}],
+                "responseDate": f"{response_date:%Y-%m-%d}T17:00:00-04:00",
+                "isActive": True,
+            })
+
+        payload = {"_embedded": {"results": results},
+                   "page": {"size": size, "totalElements": total, "totalPages": -(-total // size), "number": page}}
+        return 200, "application/json", json.dumps(payload).encode()
+
+    return {("GET", "/api/prod/sgs/v1/search/"): search}
+
+
+def _embedding(item, dimension: int) -> np.ndarray:
+    vector = np.zeros(dimension, dtype=np.float32)
+    tokens = item if isinstance(item, list) else re.findall(r"\w+", item.lower())
+    for token in tokens:
+        vector[zlib.crc32(str(token).encode()) % dimension] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def openai_routes(dimension: int = 256) -> Dict[Tuple[str, str], Route]:
+    """
+    Routes answering the OpenAI chat completions and embeddings APIs.
+
+    Chat answers are picked from the prompt: a number for ratings, a boolean query for keywords and
+    a JSON object for domains. Embeddings hash words, or token IDs, into `dimension` dimensions.
+
+    Args:
+        dimension (int): Embedding dimension.
+
+    Returns:
+        Dict[Tuple[str, str], Route]: The routes.
+    """
+    def chat(url, body):
+        request = json.loads(body)
+        prompt = " ".join(str(message.get("content", "")) for message in request.get("messages", []))
+
+        if "Rating:" in prompt:
+            content = str(random.randint(0, 100))
+        elif "Keywords:" in prompt:
+            content = " OR ".join(random.sample(WORDS, 3))
+        elif "domains" in prompt:
+            content = json.dumps({"main": random.sample(WORDS, 1), "sub": random.sample(WORDS, 2), "adj": random.sample(WORDS, 2)})
+        else:
+            content = "OK"
+
+        payload = {
+            "id": f"chatcmpl-{ObjectId()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(content.split()),
+                      "total_tokens": len(prompt.split()) + len(content.split())},
+        }
+        return 200, "application/json", json.dumps(payload).encode()
+
+    def embeddings(url, body):
+        request = json.loads(body)
+        inputs = request["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        data = []
+        for index, item in enumerate(inputs):
+            vector = _embedding(item, dimension)
+            if request.get("encoding_format") == "base64":
+                encoded = base64.b64encode(vector.tobytes()).decode()
+            else:
+                encoded = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": encoded})
+
+        payload = {"object": "list", "data": data, "model": request.get("model"),
+                   "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+        return 200, "application/json", json.dumps(payload).encode()
+
+    return {("POST", "/v1/chat/completions"): chat, ("POST", "/v1/embeddings"): embeddings}
+
+
+class _InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class _DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class _Cursor:
+    def __init__(self, documents: List[Dict]):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict]:
+        return self.documents[:length]
+
+
+def _matches(document: Dict, query: Dict) -> bool:
+    for key, condition in query.items():
+        value = document.get(key)
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if operator == "$lte" and not (value is not None and value <= operand):
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return dict(document)
+    included = [key for key, flag in projection.items() if flag]
+    if included:
+        result = {key: document[key] for key in included if key in document}
+        if projection.get("_id", 1) and "_id" in document:
+            result["_id"] = document["_id"]
+        return result
+    return {key: value for key, value in document.items() if projection.get(key, 1)}
+
+
+class MemoryCollection:
+    """
+    In-process stand-in for a motor collection, covering the queries the app makes.
+
+    Supports equality, $gte, $lte and $in filters, projections, $set updates, upserts and unique indexes.
+    """
+
+    def __init__(self):
+        self.documents = []
+        self.unique = []
+        self.lock = threading.Lock()
+
+    async def create_index(self, keys, unique: bool = False, **kwargs) -> str:
+        if unique:
+            self.unique.append([key for key, _ in keys])
+        return "_".join(f"{key}_{direction}" for key, direction in keys)
+
+    def _check_unique(self, document: Dict) -> None:
+        for keys in self.unique:
+            if any(all(other.get(key) == document.get(key) for key in keys) for other in self.documents):
+                raise DuplicateKeyError(f"Duplicate key {[document.get(key) for key in keys]}")
+
+    async def find_one(self, query: Dict, projection: Optional[Dict] = None) -> Optional[Dict]:
+        with self.lock:
+            for document in self.documents:
+                if _matches(document, query):
+                    return _project(document, projection)
+        return None
+
+    def find(self, query: Dict, projection: Optional[Dict] = None) -> _Cursor:
+        with self.lock:
+            return _Cursor([_project(document, projection) for document in self.documents if _matches(document, query)])
+
+    async def insert_one(self, document: Dict) -> _InsertOneResult:
+        document = dict(document)
+        document.setdefault("_id", ObjectId())
+        with self.lock:
+            self.documents.append(document)
+        return _InsertOneResult(document["_id"])
+
+    async def update_one(self, query: Dict, update: Dict, upsert: bool = False) -> None:
+        await self.find_one_and_update(query, update, upsert=upsert)
+
+    async def find_one_and_update(self, query: Dict, update: Dict, upsert: bool = False, **kwargs) -> Optional[Dict]:
+        with self.lock:
+            for document in self.documents:
+                if _matches(document, query):
+                    document.update(update.get("$set", {}))
+                    return dict(document)
+            if upsert:
+                document = {key: value for key, value in query.items() if not isinstance(value, dict)}
+                document.update(update.get("$set", {}))
+                document.setdefault("_id", ObjectId())
+                self._check_unique(document)
+                self.documents.append(document)
+                return dict(document)
+        return None
+
+    async def replace_one(self, query: Dict, replacement: Dict, upsert: bool = False) -> None:
+        with self.lock:
+            for i, document in enumerate(self.documents):
+                if _matches(document, query):
+                    self.documents[i] = {"_id": document["_id"], **replacement}
+                    return
+            if upsert:
+                self.documents.append({"_id": ObjectId(), **replacement})
+
+    async def delete_one(self, query: Dict) -> _DeleteResult:
+        with self.lock:
+            for i, document in enumerate(self.documents):
+                if _matches(document, query):
+                    del self.documents[i]
+                    return _DeleteResult(1)
+        return _DeleteResult(0)
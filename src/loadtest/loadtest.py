@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+import numpy as np
+
+from src.loadtest.fakes import FakeServer, MemoryCollection, WORDS, openai_routes, sam_routes, sbir_routes
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+DEFAULT_MIX = "upload=1,search=4,rate=4,domain=1"
+ENDPOINTS = ("upload", "search", "rate", "domain")
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """
+    Parse an endpoint mix such as `upload=1,search=4`, where each weight is the endpoint's share of calls.
+
+    Args:
+        mix (str): The mix.
+
+    Returns:
+        Dict[str, float]: Weight per endpoint.
+    """
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}, choose from {ENDPOINTS}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def start_fakes(args) -> Tuple[FakeServer, FakeServer, FakeServer]:
+    """
+    Start the sbir.gov, sam.gov and OpenAI stand-ins and point the app's configuration at them.
+
+    Must run before the app is imported, since the configuration is read at import time.
+
+    Args:
+        args (argparse.Namespace): The parsed command line.
+
+    Returns:
+        Tuple[FakeServer, FakeServer, FakeServer]: The running servers.
+    """
+    sbir = FakeServer(sbir_routes(pages=args.sbir_pages), latency=args.sbir_latency).start()
+    sam = FakeServer(sam_routes(total=args.sam_results), latency=args.sam_latency).start()
+    openai = FakeServer(openai_routes(), latency=args.openai_latency).start()
+
+    os.environ.update({
+        "RFP_SBIR_URL": sbir.url,
+        "RFP_SAM_URL": sam.url,
+        "OPENAI_BASE_URL": f"{openai.url}/v1",
+        "OPENAI_API_BASE": f"{openai.url}/v1",
+        "OPENAI_API_KEY": "load-test",
+        "RFP_VECTOR_STORE_BACKEND": "memory",
+        "RFP_EMBEDDINGS_BACKEND": args.embeddings,
+        "RFP_DOCSTORE_BACKEND": "file",
+        "RFP_DATA_DIR": args.data_dir,
+        "MONGODB_URL": "mongodb://127.0.0.1:1",
+    })
+    return sbir, sam, openai
+
+
+def use_memory_collections(main) -> None:
+    """
+    Replace the MongoDB collections of the app with in-memory collections.
+
+    Args:
+        main (module): The imported main module.
+    """
+    main.users_collection = MemoryCollection()
+    main.feeds_collection = MemoryCollection()
+    main.feed_leases_collection = MemoryCollection()
+    main.feed_scheduler.users_collection = main.users_collection
+    main.feed_scheduler.feeds_collection = main.feeds_collection
+    main.feed_scheduler.leases_collection = main.feed_leases_collection
+
+
+def start_app(port: int):
+    """
+    Serve main:app with uvicorn in a background thread, with MongoDB replaced by in-memory collections.
+
+    Args:
+        port (int): Port to listen on.
+
+    Returns:
+        tuple: The uvicorn server and the users collection.
+    """
+    import uvicorn
+    import main
+
+    use_memory_collections(main)
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, main.users_collection
+
+
+def request_builders(pdf: bytes) -> Dict[str, Callable[[httpx.AsyncClient, str], object]]:
+    """
+    Build one request function per endpoint of the mix.
+
+    Args:
+        pdf (bytes): Company PDF sent by uploads.
+
+    Returns:
+        Dict[str, Callable]: Functions taking the client and a user ID and returning the request coroutine.
+    """
+    def keywords():
+        return random.choice([None, " OR ".join(random.sample(WORDS, 2)), f"{random.choice(WORDS)} AND {random.choice(WORDS)}"])
+
+    return {
+        "upload": lambda client, user_id: client.post(
+            "/upload_file", data={"user_id": user_id}, files={"file": ("company.pdf", pdf, "application/pdf")}),
+        "search": lambda client, user_id: client.request(
+            "GET", "/search", json={"user_id": user_id, "keywords": keywords(), "top_k": 50, "limit": 20}),
+        "rate": lambda client, user_id: client.post(
+            "/get-rating", params={"user_id": user_id, "title": random.choice(WORDS).title(),
+                                   "proposal_description": " ".join(random.choices(WORDS, k=60))}),
+        "domain": lambda client, user_id: client.request(
+            "GET", "/get-domain", json={"user_id": user_id, "platform": random.choice(["sbir.gov", "sam.gov"])}),
+    }
+
+
+async def virtual_user(client: httpx.AsyncClient, user_id: str, weights: Dict[str, float], builders: Dict,
+                       deadline: float, samples: Dict[str, List[Tuple[float, bool]]]) -> None:
+    names = list(weights)
+    while time.monotonic() < deadline:
+        name = random.choices(names, weights=[weights[n] for n in names])[0]
+        start = time.perf_counter()
+        try:
+            response = await builders[name](client, user_id)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        samples[name].append((time.perf_counter() - start, ok))
+
+
+def report(samples: Dict[str, List[Tuple[float, bool]]], elapsed: float) -> str:
+    """
+    Summarize latencies and errors per endpoint.
+
+    Args:
+        samples (Dict[str, List[Tuple[float, bool]]]): (seconds, succeeded) of every request, per endpoint.
+        elapsed (float): Length of the run in seconds.
+
+    Returns:
+        str: The report table.
+    """
+    rows = [f"{'endpoint':<10}{'requests':>9}{'errors':>8}{'error %':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+    everything = [sample for name in samples for sample in samples[name]]
+    for name, endpoint_samples in list(sorted(samples.items())) + [("total", everything)]:
+        if not endpoint_samples:
+            continue
+        latencies = np.array([latency for latency, _ in endpoint_samples]) * 1000
+        errors = sum(1 for _, ok in endpoint_samples if not ok)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        rows.append(f"{name:<10}{len(endpoint_samples):>9}{errors:>8}{100 * errors / len(endpoint_samples):>9.1f}"
+                    f"{len(endpoint_samples) / elapsed:>8.2f}{p50:>9.0f}{p95:>9.0f}{p99:>9.0f}")
+    return "\n".join(rows)
+
+
+async def run(args, users_collection: MemoryCollection, pdf: bytes) -> Tuple[Dict, float]:
+    weights = parse_mix(args.mix)
+    builders = request_builders(pdf)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout) as client:
+        # Every user uploads its company data first, so searches and ratings have documents to use
+        user_ids = []
+        for i in range(args.users):
+            result = await users_collection.insert_one({"name": f"Load test {i}", "email": f"load{i}@example.com"})
+            user_ids.append(str(result.inserted_id))
+        setup = await asyncio.gather(*(builders["upload"](client, user_id) for user_id in user_ids))
+        failed = [response.status_code for response in setup if response.status_code >= 400]
+        if failed:
+            logging.warning(f"{len(failed)} of {len(setup)} setup uploads failed: {failed[:5]}")
+
+        samples = defaultdict(list)
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(*(virtual_user(client, user_id, weights, builders, deadline, samples) for user_id in user_ids))
+        return samples, time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test main:app against local stand-ins for every external service.")
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load after setup")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights, from {ENDPOINTS}")
+    parser.add_argument("--sbir-latency", type=float, default=0.2, help="seconds per fake sbir.gov response")
+    parser.add_argument("--sam-latency", type=float, default=0.3, help="seconds per fake sam.gov response")
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="seconds per fake OpenAI response")
+    parser.add_argument("--sbir-pages", type=int, default=5, help="result pages per sbir.gov search term")
+    parser.add_argument("--sam-results", type=int, default=300, help="results per sam.gov search term")
+    parser.add_argument("--embeddings", choices=["openai", "hashing"], default="openai",
+                        help="embed through the fake OpenAI server, or locally if tiktoken can't load its encoding")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds before a request counts as failed")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's logs and prints")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        args.data_dir = data_dir
+        servers = start_fakes(args)
+        server, users_collection = start_app(args.port)
+
+        from src.services.rag.chunking_eval import synthetic_pdfs
+        paths, _ = synthetic_pdfs(data_dir, count=1, sections=6)
+        with open(paths[0], "rb") as f:
+            pdf = f.read()
+
+        quiet = contextlib.ExitStack()
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+            quiet.enter_context(contextlib.redirect_stdout(open(os.devnull, "w")))
+        with quiet:
+            samples, elapsed = asyncio.run(run(args, users_collection, pdf))
+
+        server.should_exit = True
+        for fake in servers:
+            fake.stop()
+
+    print(f"{args.users} users, mix {args.mix}, {elapsed:.1f}s, embeddings {args.embeddings}")
+    print(f"fake latency: sbir.gov {args.sbir_latency}s, sam.gov {args.sam_latency}s, OpenAI {args.openai_latency}s")
+    print("upstream requests: " + ", ".join(f"{name} {fake.requests}" for name, fake in zip(("sbir.gov", "sam.gov", "OpenAI"), servers)))
+    print(report(samples, elapsed))
+
+
+# Example usage
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+from langchain.storage._lc_store import create_kv_docstore
+
+from src.loadtest.loadtest import start_fakes, use_memory_collections
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def worker_app():
+    """
+    App factory run by every uvicorn worker, serving main:app with MongoDB replaced by in-memory collections.
+
+    Returns:
+        FastAPI: The app.
+    """
+    import main
+
+    use_memory_collections(main)
+    return main.app
+
+
+def expected_parents(paths: List[str]) -> Dict[str, str]:
+    """
+    Split PDFs the way /upload_file does and collect the parent documents that should end up in the docstore.
+
+    Args:
+        paths (List[str]): The PDFs uploaded by one user.
+
+    Returns:
+        Dict[str, str]: Parent content keyed by parent ID.
+    """
+    from src.config.config import DEFAULT_CHUNKING_PROFILE
+    from src.services.rag.ingest import IngestPipeline
+    from src.services.rag.loader import Loader
+    from src.services.rag.splitter import make_splitters
+
+    parent_splitter, child_splitter = make_splitters(DEFAULT_CHUNKING_PROFILE)
+    pipeline = IngestPipeline(None, None, None, parent_splitter, child_splitter)
+
+    parents = {}
+    for path in paths:
+        for parent_id, parent in pipeline.split(Loader().load_document(path))[0]:
+            parents[parent_id] = parent.page_content
+    return parents
+
+
+def read_docstores(data_dir: str, expected: Dict[str, Dict[str, str]], stop, results) -> None:
+    """
+    Read every user's docstore over and over until stopped, as a query in another worker would.
+
+    Args:
+        data_dir (str): The shared data directory.
+        expected (Dict[str, Dict[str, str]]): Expected parent content per user, keyed by parent ID.
+        stop (multiprocessing.Event): Set when the uploads are done.
+        results (multiprocessing.Queue): Receives the documents read, the documents that failed to decode
+            and the documents not matching their user's data.
+    """
+    from src.services.rag.docstore import AtomicFileStore
+
+    reads = errors = foreign = 0
+    while not stop.is_set():
+        for user_id, parents in expected.items():
+            docstore = create_kv_docstore(AtomicFileStore(os.path.join(data_dir, user_id, "data")))
+            for key in list(docstore.yield_keys()):
+                try:
+                    document = docstore.mget([key])[0]
+                except Exception:
+                    errors += 1
+                    continue
+                if document is None:
+                    # Listed before another process replaced it
+                    continue
+                reads += 1
+                if parents.get(key) != document.page_content:
+                    foreign += 1
+    results.put((reads, errors, foreign))
+
+
+async def upload_all(port: int, uploads: List[Tuple[str, str]], timeout: float) -> List[int]:
+    # No keep-alive, so every upload opens a new connection and the kernel spreads them across workers
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=timeout, limits=limits) as client:
+        async def upload(user_id, path):
+            with open(path, "rb") as f:
+                content = f.read()
+            response = await client.post("/upload_file", data={"user_id": user_id, "chunking_profile": "characters"},
+                                         files={"file": (os.path.basename(path), content, "application/pdf")})
+            return response.status_code
+
+        return await asyncio.gather(*(upload(user_id, path) for user_id, path in uploads))
+
+
+def wait_until_up(port: int, process: subprocess.Popen, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("uvicorn did not start in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload and read company data concurrently through several "
+                                                 "uvicorn worker processes sharing one data directory.")
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--users", type=int, default=6)
+    parser.add_argument("--files", type=int, default=2, help="distinct PDFs per user")
+    parser.add_argument("--repeats", type=int, default=3, help="concurrent uploads of each PDF")
+    parser.add_argument("--readers", type=int, default=4, help="processes reading the docstores during the uploads")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds before an upload counts as failed")
+    parser.add_argument("--embeddings", choices=["openai", "hashing"], default="hashing",
+                        help="embed through the fake OpenAI server, or locally if tiktoken can't load its encoding")
+    parser.set_defaults(sbir_pages=1, sam_results=10, sbir_latency=0, sam_latency=0, openai_latency=0.05)
+    args = parser.parse_args()
+
+    from src.services.rag.chunking_eval import synthetic_pdfs
+
+    with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as pdf_dir:
+        args.data_dir = data_dir
+        servers = start_fakes(args)
+
+        user_ids = [f"workers-user-{i}" for i in range(args.users)]
+        paths = {}
+        for i, user_id in enumerate(user_ids):
+            os.makedirs(os.path.join(pdf_dir, user_id))
+            paths[user_id] = synthetic_pdfs(os.path.join(pdf_dir, user_id), count=args.files, sections=6, seed=i)[0]
+        expected = {user_id: expected_parents(paths[user_id]) for user_id in user_ids}
+        uploads = [(user_id, path) for user_id in user_ids for path in paths[user_id] for _ in range(args.repeats)]
+
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.loadtest.workers:worker_app", "--factory", "--workers", str(args.workers),
+             "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(args.port, server)
+
+            stop, queue = multiprocessing.Event(), multiprocessing.Queue()
+            readers = [multiprocessing.Process(target=read_docstores, args=(data_dir, expected, stop, queue))
+                       for _ in range(args.readers)]
+            for reader in readers:
+                reader.start()
+
+            start = time.monotonic()
+            statuses = asyncio.run(upload_all(args.port, uploads, args.timeout))
+            elapsed = time.monotonic() - start
+
+            stop.set()
+            results = [queue.get() for _ in readers]
+            for reader in readers:
+                reader.join()
+        finally:
+            server.terminate()
+            server.wait()
+            for fake in servers:
+                fake.stop()
+
+        from src.services.rag.docstore import AtomicFileStore
+
+        missing = extra = wrong = 0
+        for user_id in user_ids:
+            docstore = create_kv_docstore(AtomicFileStore(os.path.join(data_dir, user_id, "data")))
+            stored = set(docstore.yield_keys())
+            missing += len(set(expected[user_id]) - stored)
+            extra += len(stored - set(expected[user_id]))
+            for key, document in zip(sorted(stored), docstore.mget(sorted(stored))):
+                if key in expected[user_id] and document.page_content != expected[user_id][key]:
+                    wrong += 1
+        leftovers = [name for root, _, files in os.walk(data_dir) for name in files
+                     if name.endswith(".tmp") or name.startswith("ingest-") or root.endswith("uploads")]
+
+    failed = [status for status in statuses if status >= 400]
+    print(f"{args.workers} workers, {len(uploads)} concurrent uploads by {args.users} users in {elapsed:.1f}s, "
+          f"{len(failed)} failed {failed[:5]}")
+    print(f"docstores: {sum(len(parents) for parents in expected.values())} parents expected, "
+          f"{missing} missing, {extra} unexpected, {wrong} with the wrong content")
+    print(f"leftover temp, checkpoint or upload files: {len(leftovers)}")
+    reads, errors, foreign = (sum(column) for column in zip(*results))
+    print(f"{args.readers} readers: {reads} documents read, {errors} failed to decode, "
+          f"{foreign} not matching their user's data")
+
+    problems = {"failed uploads": len(failed), "missing": missing, "unexpected": extra, "wrong content": wrong,
+                "leftover files": len(leftovers), "torn reads": errors, "foreign reads": foreign}
+    problems = {name: count for name, count in problems.items() if count}
+    if problems:
+        print("FAIL: " + ", ".join(f"{count} {name}" for name, count in problems.items()))
+        sys.exit(1)
+    print("PASS")
+
+
+# Example usage
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from src.config.config import (FEED_PLATFORMS, FEED_REFRESH_INTERVAL, FEED_MAX_STALENESS, FEED_JITTER,
+                               FEED_CONCURRENCY, FEED_ACTIVE_DAYS, FEED_MAX_RESULTS, FEED_MIN_INTERVAL, FEED_LEASE,
+                               FEED_RETRY_COOLDOWN, FEED_RETRY_COOLDOWN_MAX, COMPANY_VIEW_QUERIES)
+from src.services.llm.llm import get_domains
+from src.services.scrapers.sbir import SbirScraper
+from src.services.scrapers.samgov import SamScraper
+from src.services.profiling.profiling import section
+from src.utils.responses import compact_results, sse_event
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+SCRAPERS = {
+    "sbir.gov": SbirScraper,
+    "sam.gov": SamScraper,
+}
+
+
+def company_views(scraper) -> str:
+    """
+    Retrieve the company overview, capabilities and past performance in one batched retrieval.
+
+    Args:
+        scraper (Scraper): The platform scraper, already initialized for the user.
+
+    Returns:
+        str: The retrieved views, falling back to the scraper's company data if none are found.
+    """
+    views = scraper.retriever.get_query_docs_many(COMPANY_VIEW_QUERIES, k=1)
+    views = [view for view in views if view]
+    return "\n\n".join(dict.fromkeys(views)) if views else scraper.docs
+
+
+def scrape_domains(scraper, user_id: str) -> Dict[str, Dict]:
+    """
+    Scrape and rate opportunities for every main, sub and adjacent domain of a company.
+
+    Args:
+        scraper (Scraper): The platform scraper, already initialized for the user.
+        user_id (str): The user ID.
+
+    Returns:
+        Dict[str, Dict]: Results keyed by domain type, then by domain name.
+    """
+    domains = get_domains(company_data=company_views(scraper))
+
+    results = {}
+    for domain in domains.keys():
+        temp_res = {}
+        for domain_name in domains[domain]:
+            logging.info(f"Scraping {domain_name}...")
+            with section(f"domain {domain}"):
+                temp_res[domain_name] = scraper.scrape(user_id=user_id, keywords=domain_name, rate=True)
+        results[domain] = temp_res
+    return results
+
+
+async def stream_domains(scraper, user_id: str, is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[str]:
+    """
+    Scrape the domains of a company one by one, yielding server-sent events as results arrive.
+
+    A `domains` event lists the domains to scrape. Each scraped domain yields a `domain` event, nested
+    as `{domain type: {domain name: results}}` like the /get-domain response, followed by a `progress`
+    event. A domain that fails to scrape yields an `error` event naming it instead, and is left out of
+    the final `summary` event, which holds the number of results per domain in the same nesting.
+    Remaining domains are skipped once the client disconnects.
+
+    Args:
+        scraper (Scraper): The platform scraper, already initialized for the user.
+        user_id (str): The user ID.
+        is_disconnected (Callable[[], Awaitable[bool]]): Checks whether the client has gone away.
+
+    Yields:
+        str: The encoded events.
+    """
+    domains = await asyncio.to_thread(lambda: get_domains(company_data=company_views(scraper)))
+    if not domains:
+        yield sse_event("error", {"detail": "Could not extract the company domains"})
+        return
+
+    yield sse_event("domains", domains)
+
+    total = sum(len(names) for names in domains.values())
+    done = 0
+    summary = {domain: {} for domain in domains}
+
+    for domain, names in domains.items():
+        for domain_name in names:
+            if await is_disconnected():
+                logging.info(f"Client disconnected, skipping {total - done} remaining domains")
+                return
+
+            logging.info(f"Scraping {domain_name}...")
+            done += 1
+            try:
+                results = await asyncio.to_thread(scraper.scrape, user_id=user_id, keywords=domain_name, rate=True)
+            except Exception as e:
+                # One failing domain shouldn't end the stream for the others
+                logging.error(f"Error scraping {domain_name}: {e}")
+                yield sse_event("error", {"domain": domain, "name": domain_name, "detail": "Could not scrape the domain"})
+            else:
+                summary[domain][domain_name] = len(results)
+                yield sse_event("domain", {domain: {domain_name: results}})
+            yield sse_event("progress", {"done": done, "total": total})
+
+    yield sse_event("summary", summary)
+
+
+def build_feed(user_id: str, platform: str) -> Dict:
+    """
+    Build the ranked feed of a user for one platform.
+
+    Args:
+        user_id (str): The user ID.
+        platform (str): The platform, one of FEED_PLATFORMS.
+
+    Returns:
+        Dict: The ranked keyword search results and the per-domain results.
+    """
+    scraper = SCRAPERS[platform](user_id)
+
+    results = scraper.scrape(user_id=user_id, rate=True)
+    domains = scrape_domains(scraper, user_id)
+
+    def top(opportunities):
+        return [opportunity.to_dict() for opportunity in compact_results(opportunities, limit=FEED_MAX_RESULTS, sort=True)]
+
+    return {
+        "results": top(results),
+        "domains": {domain: {name: top(res) for name, res in names.items()} for domain, names in domains.items()},
+    }
+
+
+class FeedScheduler:
+    """
+    Rebuilds the feeds of active users on a schedule and when a stale feed is read.
+
+    Every worker runs its own scheduler, so a rebuild first takes a lease on the feed in the leases
+    collection. The lease is only granted once FEED_MIN_INTERVAL has passed since the last rebuild, or
+    the retry cooldown since the last failed one, so each feed is rebuilt by one worker at a time.
+    """
+
+    def __init__(self, users_collection, feeds_collection, leases_collection):
+        self.users_collection = users_collection
+        self.feeds_collection = feeds_collection
+        self.leases_collection = leases_collection
+        self.owner = uuid.uuid4().hex
+        self.semaphore = asyncio.Semaphore(FEED_CONCURRENCY)
+        self.refreshing = {}
+        self.task = None
+
+    async def start(self) -> None:
+        """
+        Start the periodic rebuild loop.
+        """
+        await self.feeds_collection.create_index([("user_id", 1), ("platform", 1)], unique=True)
+        await self.leases_collection.create_index([("user_id", 1), ("platform", 1)], unique=True)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the periodic rebuild loop and cancel pending rebuilds.
+        """
+        tasks = list(self.refreshing.values())
+        if self.task:
+            tasks.append(self.task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get_feed(self, user_id: str, platform: str) -> Optional[Dict]:
+        """
+        Read the precomputed feed of a user, requesting a rebuild if it is missing or stale.
+
+        Args:
+            user_id (str): The user ID.
+            platform (str): The platform, one of FEED_PLATFORMS.
+
+        Returns:
+            Optional[Dict]: The stored feed with a `stale` flag, or None if no feed has been generated yet.
+        """
+        user_key = ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id
+        await self.users_collection.update_one({"_id": user_key}, {"$set": {"last_active": datetime.utcnow()}})
+
+        feed = await self.feeds_collection.find_one({"user_id": user_id, "platform": platform}, {"_id": 0})
+
+        stale = feed is None or datetime.utcnow() - feed["generated_at"] > timedelta(seconds=FEED_MAX_STALENESS)
+        if stale:
+            self.refresh(user_id, platform, delay=0)
+
+        if feed is not None:
+            feed["stale"] = stale
+        return feed
+
+    def refresh(self, user_id: str, platform: str, delay: Optional[float] = None) -> asyncio.Task:
+        """
+        Schedule a rebuild of a user's feed, reusing the pending rebuild if there is one.
+
+        The rebuild is skipped if the lease on the feed can't be taken.
+
+        Args:
+            user_id (str): The user ID.
+            platform (str): The platform, one of FEED_PLATFORMS.
+            delay (Optional[float]): Seconds to wait before rebuilding, a random jitter is used if None.
+
+        Returns:
+            asyncio.Task: The rebuild task.
+        """
+        key = (user_id, platform)
+        if key not in self.refreshing:
+            if delay is None:
+                delay = random.uniform(0, FEED_JITTER)
+            task = asyncio.create_task(self._refresh(user_id, platform, delay))
+            task.add_done_callback(lambda _: self.refreshing.pop(key, None))
+            self.refreshing[key] = task
+        return self.refreshing[key]
+
+    async def _acquire(self, user_id: str, platform: str) -> Optional[Dict]:
+        now = datetime.utcnow()
+        try:
+            return await self.leases_collection.find_one_and_update(
+                {"user_id": user_id, "platform": platform, "available_at": {"$lte": now}},
+                {"$set": {"available_at": now + timedelta(seconds=FEED_LEASE), "owner": self.owner}},
+                upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # Another worker is rebuilding the feed, it was rebuilt recently or the last rebuild is cooling down
+            return None
+
+    async def _release(self, lease: Dict, failed: bool) -> None:
+        failures = lease.get("failures", 0) + 1 if failed else 0
+        if failed:
+            wait = min(FEED_RETRY_COOLDOWN * 2 ** (failures - 1), FEED_RETRY_COOLDOWN_MAX)
+        else:
+            wait = FEED_MIN_INTERVAL
+        await self.leases_collection.update_one(
+            {"user_id": lease["user_id"], "platform": lease["platform"], "owner": self.owner},
+            {"$set": {"available_at": datetime.utcnow() + timedelta(seconds=wait), "failures": failures}})
+
+    async def _refresh(self, user_id: str, platform: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        async with self.semaphore:
+            lease = await self._acquire(user_id, platform)
+            if lease is None:
+                return
+
+            logging.info(f"Rebuilding {platform} feed for user {user_id}")
+            try:
+                feed = await asyncio.to_thread(build_feed, user_id, platform)
+            except Exception as e:
+                logging.error(f"Error rebuilding {platform} feed for user {user_id}: {e}")
+                await self._release(lease, failed=True)
+                return
+
+        feed.update({"user_id": user_id, "platform": platform, "generated_at": datetime.utcnow()})
+        await self.feeds_collection.replace_one({"user_id": user_id, "platform": platform}, feed, upsert=True)
+        await self._release(lease, failed=False)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                since = datetime.utcnow() - timedelta(days=FEED_ACTIVE_DAYS)
+                async for user in self.users_collection.find({"last_active": {"$gte": since}}, {"_id": 1}):
+                    for platform in FEED_PLATFORMS:
+                        self.refresh(str(user["_id"]), platform)
+            except Exception as e:
+                logging.error(f"Error scheduling feed rebuilds: {e}")
+            await asyncio.sleep(FEED_REFRESH_INTERVAL)
@@ -0,0 +1,273 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import openai
+import requests
+import urllib3
+
+from src.config.config import (GOVERNOR_INITIAL_LIMIT, GOVERNOR_MIN_LIMIT, GOVERNOR_MAX_LIMIT, GOVERNOR_LATENCY_TARGET,
+                               GOVERNOR_DECREASE_FACTOR, GOVERNOR_RETRIES, GOVERNOR_BACKOFF_BASE, GOVERNOR_BACKOFF_MAX,
+                               GOVERNOR_FAILURE_THRESHOLD, GOVERNOR_COOLDOWN, GOVERNOR_TIMEOUT)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+OPENAI_HOST = "api.openai.com"
+PINECONE_HOST = "pinecone.io"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the host's circuit is open."""
+
+
+class RetryableError(Exception):
+    """Raised for responses that should be retried, such as 429 and 5xx."""
+
+    def __init__(self, response: requests.Response):
+        super().__init__(f"{response.status_code} from {response.url}")
+        self.response = response
+
+
+# Transport failures, raised by requests for the scrapers, by openai and by urllib3 under the Pinecone client
+TRANSPORT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    openai.APIConnectionError,
+    urllib3.exceptions.MaxRetryError,
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.TimeoutError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Check whether an error means the host is failing or throttling, rather than that the call itself is wrong.
+
+    Transport errors, timeouts, 429 and 5xx responses are retryable. Anything else, such as an
+    authentication error or an output parsing error, would fail the same way again.
+
+    Args:
+        error (Exception): The error raised by the call.
+
+    Returns:
+        bool: Whether the call should be retried and counted against the host.
+    """
+    if isinstance(error, (RetryableError, TRANSPORT_ERRORS)):
+        return True
+    # openai.APIStatusError has status_code, Pinecone's PineconeApiException has status
+    status_code = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+class HostState:
+    def __init__(self):
+        self.limit = float(GOVERNOR_INITIAL_LIMIT)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.latency = None
+        self.failures = 0
+        self.circuit = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.calls = 0
+        self.errors = 0
+
+    def snapshot(self) -> Dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "latency": None if self.latency is None else round(self.latency, 3),
+            "consecutive_failures": self.failures,
+            "circuit": self.circuit,
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+
+class Governor:
+    def __init__(self):
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def host(self, name: str) -> HostState:
+        with self.lock:
+            if name not in self.hosts:
+                self.hosts[name] = HostState()
+            return self.hosts[name]
+
+    @contextmanager
+    def slot(self, name: str):
+        """
+        Hold one of the host's concurrency slots for the duration of a call.
+
+        Args:
+            name (str): The host name.
+
+        Raises:
+            CircuitOpenError: If the host's circuit is open.
+        """
+        state = self.host(name)
+        probe = False
+        with state.condition:
+            if state.circuit == OPEN:
+                if time.monotonic() - state.opened_at < GOVERNOR_COOLDOWN:
+                    raise CircuitOpenError(f"Circuit open for {name}")
+                state.circuit = HALF_OPEN
+            if state.circuit == HALF_OPEN:
+                # Only one probe call goes through while the host is recovering
+                if state.probing:
+                    raise CircuitOpenError(f"Circuit half open for {name}")
+                state.probing = probe = True
+
+            while state.in_flight >= int(state.limit):
+                state.condition.wait()
+            state.in_flight += 1
+        try:
+            yield state
+        finally:
+            with state.condition:
+                state.in_flight -= 1
+                if probe:
+                    state.probing = False
+                state.condition.notify_all()
+
+    def record(self, name: str, latency: float, success: bool) -> None:
+        """
+        Feed the outcome of a call back into the host's limit and circuit.
+
+        The limit grows additively on fast successes and shrinks multiplicatively on failures
+        or slow calls.
+
+        Args:
+            name (str): The host name.
+            latency (float): The call latency in seconds.
+            success (bool): Whether the call succeeded.
+        """
+        state = self.host(name)
+        with state.condition:
+            state.calls += 1
+            state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+
+            if success:
+                state.failures = 0
+                if state.circuit != CLOSED:
+                    logging.info(f"Circuit closed for {name}")
+                state.circuit = CLOSED
+            else:
+                state.errors += 1
+                state.failures += 1
+                if state.circuit == HALF_OPEN or state.failures >= GOVERNOR_FAILURE_THRESHOLD:
+                    if state.circuit != OPEN:
+                        logging.warning(f"Circuit opened for {name} after {state.failures} failures")
+                    state.circuit = OPEN
+                    state.opened_at = time.monotonic()
+
+            if success and latency <= GOVERNOR_LATENCY_TARGET:
+                state.limit = min(GOVERNOR_MAX_LIMIT, state.limit + 1 / state.limit)
+            else:
+                state.limit = max(GOVERNOR_MIN_LIMIT, state.limit * GOVERNOR_DECREASE_FACTOR)
+            state.condition.notify_all()
+
+    def call(self, name: str, fn: Callable, *args, retries: int = GOVERNOR_RETRIES, **kwargs) -> Any:
+        """
+        Run an outbound call under the host's concurrency limit, retrying failures with jittered backoff.
+
+        Only errors for which `is_retryable` holds are retried and recorded against the host. Any other
+        error is raised at once and leaves the host's limit and circuit untouched.
+
+        Args:
+            name (str): The host name.
+            fn (Callable): The function making the call.
+            retries (int): Number of retries after the first attempt.
+
+        Returns:
+            Any: The function's return value.
+
+        Raises:
+            CircuitOpenError: If the host's circuit is open.
+        """
+        for attempt in range(retries + 1):
+            with self.slot(name):
+                start = time.monotonic()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    self.record(name, time.monotonic() - start, success=False)
+                    if attempt == retries:
+                        raise
+                    delay = _retry_after(e) or random.uniform(0, min(GOVERNOR_BACKOFF_MAX, GOVERNOR_BACKOFF_BASE * 2 ** attempt))
+                    logging.warning(f"Call to {name} failed ({e}), retrying in {delay:.1f}s")
+                else:
+                    self.record(name, time.monotonic() - start, success=True)
+                    return result
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a governed GET request. 429 and 5xx responses count as failures and are retried.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Returns:
+            requests.Response: The response.
+        """
+        kwargs.setdefault("timeout", GOVERNOR_TIMEOUT)
+
+        def send():
+            response = requests.get(url, **kwargs)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise RetryableError(response)
+            return response
+
+        return self.call(urlparse(url).netloc, send)
+
+    def is_degraded(self, name: str) -> bool:
+        """
+        Check whether a host is currently failing or throttled below its initial limit.
+
+        Args:
+            name (str): The host name.
+
+        Returns:
+            bool: Whether the host is degraded.
+        """
+        state = self.host(name)
+        return state.circuit != CLOSED or state.limit < GOVERNOR_INITIAL_LIMIT
+
+    def state(self) -> Dict[str, Dict]:
+        """
+        Report the limit, latency and circuit of every host seen so far.
+
+        Returns:
+            Dict[str, Dict]: Host state keyed by host name.
+        """
+        with self.lock:
+            hosts = dict(self.hosts)
+        return {name: dict(state.snapshot(), degraded=self.is_degraded(name)) for name, state in hosts.items()}
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    if isinstance(error, RetryableError):
+        try:
+            return min(GOVERNOR_BACKOFF_MAX, float(error.response.headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+governor = Governor()
@@ -9,6 +9,8 @@ from langchain.chains import LLMChain
 
 from src.config.creds import OPENAI_API_KEY
 from src.config.config import ENGINE
+from src.services.governor.governor import governor, OPENAI_HOST
+from src.services.profiling.profiling import profiled
 from src.services.llm.prompt import rating_prompt, keywords_extraction_prompt, domains_prompt, parser
 
 # Set up logging
@@ -16,6 +18,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 
 
+@profiled("llm.generate_rating")
 def generate_rating(title: str, proposal_description: str, company_description: str) -> Tuple[int, str]:
     """
     Generate a rating for the relevance of a proposal based on the company description.
@@ -33,9 +36,9 @@ def generate_rating(title: str, proposal_description: str, company_description:
         if not title or not proposal_description or not company_description:
             raise ValueError("All input parameters (title, proposal_description, company_description) are required.")
 
-        llm = ChatOpenAI(model_name=ENGINE, temperature=0, openai_api_key=OPENAI_API_KEY)
+        llm = ChatOpenAI(model_name=ENGINE, temperature=0, openai_api_key=OPENAI_API_KEY, max_retries=0)
         chain = LLMChain(llm=llm, prompt=rating_prompt)
-        response = chain.invoke({
+        response = governor.call(OPENAI_HOST, chain.invoke, {
             "title": title,
             "proposal_description": proposal_description,
             "company_description": company_description
@@ -54,6 +57,7 @@ def generate_rating(title: str, proposal_description: str, company_description:
     
     
     
+@profiled("llm.extract_keywords")
 def extract_keywords(company_description: str, max_keywords: int) -> str:
     """
     Extract keywords from a company description using a language model.
@@ -69,9 +73,9 @@ def extract_keywords(company_description: str, max_keywords: int) -> str:
         if not company_description:
             raise ValueError("Company description is required.")
 
-        llm = ChatOpenAI(model_name=ENGINE, temperature=0, openai_api_key=OPENAI_API_KEY)
+        llm = ChatOpenAI(model_name=ENGINE, temperature=0, openai_api_key=OPENAI_API_KEY, max_retries=0)
         chain = LLMChain(llm=llm, prompt=keywords_extraction_prompt)
-        response = chain.invoke({
+        response = governor.call(OPENAI_HOST, chain.invoke, {
             "company_description": company_description,
             "max_keywords": max_keywords
         })
@@ -84,6 +88,7 @@ def extract_keywords(company_description: str, max_keywords: int) -> str:
     
     
     
+@profiled("llm.get_domains")
 def get_domains(company_data: dict) -> dict:
     """
     Extract main, sub, and adjacent domains of a company based on the given data about the company.
@@ -99,10 +104,10 @@ def get_domains(company_data: dict) -> dict:
         if not company_data:
             raise ValueError("Company data is required.")
 
-        llm = ChatOpenAI(model_name=ENGINE, temperature=0, openai_api_key=OPENAI_API_KEY)
+        llm = ChatOpenAI(model_name=ENGINE, temperature=0, openai_api_key=OPENAI_API_KEY, max_retries=0)
         chain = chain = domains_prompt | llm | parser
 
-        response = chain.invoke({
+        response = governor.call(OPENAI_HOST, chain.invoke, {
             "company_data": company_data
         })
 
@@ -0,0 +1,399 @@
+import contextlib
+import contextvars
+import cProfile
+import functools
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from src.config.config import PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_SAMPLE_INTERVAL, PROFILE_KEEP
+from src.config.creds import PROFILE_TOKEN
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+PROFILE_MODES = ("sample", "cprofile")
+SKIPPED_FILES = {__file__, contextlib.__file__}
+
+_session = contextvars.ContextVar("profile_session", default=None)
+_stack = contextvars.ContextVar("profile_stack", default=())
+
+
+class ProfileSession:
+    """
+    Profile of a single request.
+
+    Named sections record their wall time per stage path. In "sample" mode a background thread samples
+    the stacks of the threads currently inside a section of this request, in "cprofile" mode every such
+    thread runs under its own cProfile.Profile.
+    """
+
+    def __init__(self, name: str, mode: str = "sample", interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.name = name
+        self.mode = mode
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.section_times = defaultdict(float)
+        self.section_counts = Counter()
+        self.threads = {}
+        self.depths = Counter()
+        self.profilers = {}
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.sampler = None
+        self.started_at = None
+        self.duration = None
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        if self.mode == "sample":
+            self.sampler = threading.Thread(target=self._sample, name=f"profiler-{self.id}", daemon=True)
+            self.sampler.start()
+
+    def stop(self) -> None:
+        self.duration = time.time() - self.started_at
+        self.stopped.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        for profiler in self.profilers.values():
+            profiler.disable()
+
+    def enter(self, path: tuple) -> None:
+        thread_id = threading.get_ident()
+        with self.lock:
+            self.threads[thread_id] = path
+            self.depths[thread_id] += 1
+            first = self.depths[thread_id] == 1
+        if first and self.mode == "cprofile":
+            profiler = self.profilers.setdefault(thread_id, cProfile.Profile())
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profile already owns this thread, e.g. a concurrent request on the event loop
+                pass
+
+    def exit(self, path: tuple, elapsed: float) -> None:
+        thread_id = threading.get_ident()
+        with self.lock:
+            self.section_times[path] += elapsed
+            self.section_counts[path] += 1
+            self.depths[thread_id] -= 1
+            last = self.depths[thread_id] == 0
+            if last:
+                del self.threads[thread_id]
+            else:
+                self.threads[thread_id] = path[:-1]
+        if last and self.mode == "cprofile" and thread_id in self.profilers:
+            self.profilers[thread_id].disable()
+
+    def _sample(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            with self.lock:
+                threads = list(self.threads.items())
+            for thread_id, path in threads:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename in SKIPPED_FILES:
+                        frame = frame.f_back
+                        continue
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(list(path) + stack[::-1])] += 1
+
+    def save(self, directory: str = PROFILE_DIR) -> Dict:
+        """
+        Write the profile files and their metadata.
+
+        Args:
+            directory (str): Directory the files are written to.
+
+        Returns:
+            Dict: The profile metadata.
+        """
+        os.makedirs(directory, exist_ok=True)
+        files = {}
+
+        # Collapsed stacks of section self time in microseconds, readable by flamegraph tools
+        self_times = dict(self.section_times)
+        for path, elapsed in self.section_times.items():
+            if len(path) > 1 and path[:-1] in self_times:
+                self_times[path[:-1]] -= elapsed
+        files["sections"] = f"{self.id}.sections.txt"
+        with open(os.path.join(directory, files["sections"]), "w") as f:
+            for path, elapsed in sorted(self_times.items()):
+                f.write(f"{';'.join(path)} {max(int(elapsed * 1e6), 0)}\n")
+
+        if self.mode == "sample":
+            files["collapsed"] = f"{self.id}.collapsed.txt"
+            with open(os.path.join(directory, files["collapsed"]), "w") as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        elif self.profilers:
+            files["pstats"] = f"{self.id}.pstats"
+            stats = pstats.Stats(*self.profilers.values())
+            stats.dump_stats(os.path.join(directory, files["pstats"]))
+
+        metadata = {
+            "id": self.id,
+            "name": self.name,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "sections": {";".join(path): {"seconds": round(elapsed, 6), "calls": self.section_counts[path]}
+                         for path, elapsed in sorted(self.section_times.items())},
+            "files": files,
+        }
+        with open(os.path.join(directory, f"{self.id}.json"), "w") as f:
+            json.dump(metadata, f)
+
+        prune_profiles(directory)
+        return metadata
+
+
+@contextmanager
+def section(name: str):
+    """
+    Mark a named pipeline stage, recorded when the current request is being profiled.
+
+    Outside a profiled request this only costs a context variable lookup.
+
+    Args:
+        name (str): The stage name, e.g. "sbir.fetch_term".
+    """
+    session = _session.get()
+    if session is None:
+        yield
+        return
+
+    path = _stack.get() + (name,)
+    token = _stack.set(path)
+    session.enter(path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        session.exit(path, time.perf_counter() - start)
+        _stack.reset(token)
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorate a function so each call is recorded as a named section.
+
+    Args:
+        name (str): The stage name.
+
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with section(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Bind a function to the caller's context, so sections it enters from a worker thread stay part of the request.
+
+    Each call runs in its own copy of the context, so the wrapper can be used by several threads at once.
+
+    Args:
+        fn (Callable): The function submitted to a thread pool.
+
+    Returns:
+        Callable: The bound function.
+    """
+    if _session.get() is None:
+        return fn
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """
+    Check a profiling token against PROFILE_TOKEN. Profiling on demand is disabled when no token is configured.
+
+    Args:
+        token (Optional[str]): The token sent with the request.
+
+    Returns:
+        bool: Whether the token grants admin access.
+    """
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def should_sample() -> bool:
+    """
+    Decide whether a request without a profiling token is profiled, at PROFILE_SAMPLE_RATE.
+
+    Returns:
+        bool: Whether to profile the request.
+    """
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start_session(name: str, mode: str = "sample") -> ProfileSession:
+    """
+    Start a profile. Sections only record into it inside `activate(session)`.
+
+    Args:
+        name (str): Name of the profiled work, e.g. "POST /upload_file".
+        mode (str): "sample" or "cprofile".
+
+    Returns:
+        ProfileSession: The started session.
+    """
+    session = ProfileSession(name, mode=mode)
+    session.start()
+    return session
+
+
+@contextmanager
+def activate(session: ProfileSession):
+    """
+    Make a session the profile of the current context and of every task or thread started from it.
+
+    Args:
+        session (ProfileSession): The session.
+    """
+    token = _session.set(session)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def end_session(session: ProfileSession) -> Optional[Dict]:
+    """
+    Stop a profile and save it. Failures are logged rather than raised, so profiling never fails a request.
+
+    Args:
+        session (ProfileSession): The session.
+
+    Returns:
+        Optional[Dict]: The profile metadata, or None if saving failed.
+    """
+    session.stop()
+    try:
+        metadata = session.save()
+    except Exception as e:
+        logging.error(f"Error saving profile {session.id}: {e}")
+        return None
+    logging.info(f"Saved profile {session.id} of {session.name} ({session.duration:.3f}s)")
+    return metadata
+
+
+def _profile_names(directory: str) -> List[str]:
+    modified = {}
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            try:
+                modified[name] = os.path.getmtime(os.path.join(directory, name))
+            except FileNotFoundError:
+                # Pruned by another worker
+                pass
+    return sorted(modified, key=modified.get, reverse=True)
+
+
+def list_profiles(directory: str = PROFILE_DIR, limit: int = 50) -> List[Dict]:
+    """
+    List the most recent saved profiles.
+
+    Args:
+        directory (str): Directory the profiles are saved in.
+        limit (int): Maximum number of profiles to list.
+
+    Returns:
+        List[Dict]: Profile metadata, newest first, without the per-section breakdown.
+    """
+    if not os.path.isdir(directory):
+        return []
+    names = _profile_names(directory)[:limit]
+
+    profiles = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        metadata.pop("sections", None)
+        profiles.append(metadata)
+    return profiles
+
+
+def prune_profiles(directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP) -> None:
+    """
+    Delete all but the newest profiles.
+
+    Args:
+        directory (str): Directory the profiles are saved in.
+        keep (int): Number of profiles to keep.
+    """
+    for name in _profile_names(directory)[keep:]:
+        profile_id = name[:-len(".json")]
+        for file_name in os.listdir(directory):
+            if file_name.startswith(profile_id):
+                try:
+                    os.remove(os.path.join(directory, file_name))
+                except FileNotFoundError:
+                    pass
+
+
+# Example usage
+if __name__ == "__main__":
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    @profiled("fetch")
+    def fetch(i):
+        time.sleep(0.02)
+        return sum(j * j for j in range(20000))
+
+    @profiled("pipeline")
+    def pipeline():
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(propagate(fetch), range(8)))
+        with section("rank"):
+            sorted(random.random() for _ in range(200000))
+
+    start = time.perf_counter()
+    pipeline()
+    print(f"unprofiled: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in PROFILE_MODES:
+            session = start_session("example", mode=mode)
+            with activate(session):
+                pipeline()
+            session.stop()
+            metadata = session.save(directory)
+            print(f"{mode}: {metadata['duration'] * 1000:.1f} ms, files {sorted(metadata['files'])}")
+            for path, stats in metadata["sections"].items():
+                print(f"    {path}: {stats['calls']} calls, {stats['seconds'] * 1000:.1f} ms")
+        print(f"{len(list_profiles(directory))} profiles listed")
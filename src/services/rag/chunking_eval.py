@@ -0,0 +1,151 @@
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import fitz
+from langchain.retrievers import ParentDocumentRetriever
+from langchain.storage import InMemoryStore
+
+from src.config.config import CHUNKING_PROFILES
+from src.services.rag.loader import Loader
+from src.services.rag.local import HashingEmbeddings, InMemoryVectorStore
+from src.services.rag.splitter import make_splitters
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+FILLER_WORDS = ["engineering", "systems", "delivery", "mission", "support", "integration", "quality", "analysis",
+                "program", "development", "operations", "research", "design", "testing", "capability", "team"]
+PRODUCTS = ["sensors", "drones", "radios", "batteries", "antennas", "servers", "satellites", "turbines"]
+AGENCIES = ["Army", "Navy", "Air Force", "Department of Energy", "NASA", "NIH"]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def synthetic_pdfs(directory: str, count: int = 3, sections: int = 12, seed: int = 0) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Write synthetic company PDFs with one known fact per section.
+
+    Args:
+        directory (str): Directory to write the PDFs to.
+        count (int): Number of PDFs.
+        sections (int): Number of sections, one per page, in each PDF.
+        seed (int): Random seed.
+
+    Returns:
+        Tuple[List[str], List[Tuple[str, str]]]: The PDF paths and the (query, expected answer) pairs.
+    """
+    generator = random.Random(seed)
+    paths = []
+    queries = []
+
+    for doc_index in range(count):
+        pdf = fitz.open()
+        for section in range(sections):
+            name = f"P{doc_index}{section}{generator.randint(100, 999)}"
+            product = generator.choice(PRODUCTS)
+            units = generator.randint(10, 9999)
+            fact = f"Project {name} delivered {units} units of {product} to the {generator.choice(AGENCIES)}."
+            queries.append((f"How many {product} did project {name} deliver?", f"delivered {units} units"))
+
+            paragraphs = [" ".join(generator.choices(FILLER_WORDS, k=60)) + "." for _ in range(4)]
+            paragraphs.insert(generator.randint(0, len(paragraphs)), fact)
+
+            page = pdf.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), f"Section {section + 1}\n\n" + "\n\n".join(paragraphs), fontsize=9)
+
+        path = os.path.join(directory, f"synthetic_{doc_index}.pdf")
+        pdf.save(path)
+        paths.append(path)
+
+    return paths, queries
+
+
+def sentence_queries(documents: List, count: int = 20, seed: int = 0) -> List[Tuple[str, str]]:
+    """
+    Sample sentences from documents to use as self-retrieval queries.
+
+    Args:
+        documents (List): The loaded documents.
+        count (int): Maximum number of queries.
+        seed (int): Random seed.
+
+    Returns:
+        List[Tuple[str, str]]: The (query, expected answer) pairs, where both are the sentence.
+    """
+    sentences = []
+    for document in documents:
+        for sentence in re.split(r'(?<=[.!?])\s+', " ".join(document.page_content.split())):
+            if len(sentence.split()) >= 8:
+                sentences.append(sentence)
+
+    sentences = random.Random(seed).sample(sentences, min(count, len(sentences)))
+    return [(sentence, sentence) for sentence in sentences]
+
+
+def evaluate(profile: str, paths: List[str], queries: List[Tuple[str, str]], k: int = 1) -> Dict:
+    """
+    Ingest PDFs with a chunking profile and measure vector volume, ingest time and retrieval hit rate.
+
+    Args:
+        profile (str): The name of a profile in CHUNKING_PROFILES.
+        paths (List[str]): The PDFs to ingest.
+        queries (List[Tuple[str, str]]): The (query, expected answer) pairs.
+        k (int): Number of parent documents checked for the expected answer.
+
+    Returns:
+        Dict: The number of vectors per document, ingest time in seconds and hit rate.
+    """
+    parent_splitter, child_splitter = make_splitters(profile)
+    vectorstore = InMemoryVectorStore(HashingEmbeddings())
+    retriever = ParentDocumentRetriever(
+        vectorstore=vectorstore,
+        docstore=InMemoryStore(),
+        child_splitter=child_splitter,
+        parent_splitter=parent_splitter,
+        search_kwargs={"k": k},
+    )
+
+    documents = Loader().load_documents(paths)
+
+    start = time.perf_counter()
+    retriever.add_documents(documents)
+    ingest_time = time.perf_counter() - start
+
+    hits = 0
+    for query, expected in queries:
+        parents = retriever.get_relevant_documents(query)[:k]
+        if any(_normalize(expected) in _normalize(parent.page_content) for parent in parents):
+            hits += 1
+
+    return {
+        "vectors_per_document": len(vectorstore) / len(paths),
+        "ingest_time": ingest_time,
+        "hit_rate": hits / len(queries) if queries else 0.0,
+    }
+
+
+# Example usage
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic_paths, synthetic_queries = synthetic_pdfs(directory)
+        company_queries = sentence_queries(Loader().load_document("company.pdf"))
+
+        datasets = {
+            "company.pdf": (["company.pdf"], company_queries),
+            "synthetic": (synthetic_paths, synthetic_queries),
+        }
+
+        print(f"{'profile':<14}{'dataset':<14}{'vectors/doc':>12}{'ingest (s)':>12}{'hit rate':>10}")
+        for profile in CHUNKING_PROFILES:
+            for dataset, (paths, queries) in datasets.items():
+                result = evaluate(profile, paths, queries)
+                print(f"{profile:<14}{dataset:<14}{result['vectors_per_document']:>12.1f}"
+                      f"{result['ingest_time']:>12.3f}{result['hit_rate']:>10.2f}")
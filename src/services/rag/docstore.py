@@ -0,0 +1,164 @@
+import fcntl
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from langchain.storage import LocalFileStore
+from langchain_core.stores import ByteStore
+from pymongo import MongoClient, ReplaceOne
+
+from src.config.config import DOCSTORE_BACKEND
+from src.config.creds import MONGODB_URL
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Hold an exclusive lock on a file, shared by every process on the host.
+
+    Args:
+        path (str): The lock file, created if missing.
+    """
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class AtomicFileStore(LocalFileStore):
+    """
+    LocalFileStore that writes every value to a temporary file and renames it into place.
+
+    Readers in other processes see either the previous value or the new one, never a partial write.
+    """
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        for key, value in key_value_pairs:
+            full_path = self._get_full_path(key)
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+
+            temp_path = full_path.with_name(f".{full_path.name}.{uuid.uuid4().hex}.tmp")
+            try:
+                with open(temp_path, "wb") as f:
+                    f.write(value)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, full_path)
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            try:
+                self._get_full_path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def yield_keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        for key in super().yield_keys(prefix=prefix):
+            if not os.path.basename(key).startswith("."):
+                yield key
+
+
+_mongo_client = None
+
+
+def _mongo_collection():
+    global _mongo_client
+    if _mongo_client is None:
+        _mongo_client = MongoClient(MONGODB_URL)
+        _mongo_client.rfp_scraper.docstore.create_index([("namespace", 1), ("key", 1)], unique=True)
+    return _mongo_client.rfp_scraper.docstore
+
+
+class MongoByteStore(ByteStore):
+    """
+    ByteStore kept in the shared MongoDB, so every worker and node sees the same parent documents.
+    """
+
+    def __init__(self, namespace: str, collection=None):
+        self.namespace = namespace
+        self.collection = collection if collection is not None else _mongo_collection()
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        found = {
+            document["key"]: document["value"]
+            for document in self.collection.find({"namespace": self.namespace, "key": {"$in": list(keys)}})
+        }
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, bytes]]) -> None:
+        if key_value_pairs:
+            self.collection.bulk_write([
+                ReplaceOne({"namespace": self.namespace, "key": key}, {"namespace": self.namespace, "key": key, "value": value}, upsert=True)
+                for key, value in key_value_pairs
+            ])
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        self.collection.delete_many({"namespace": self.namespace, "key": {"$in": list(keys)}})
+
+    def yield_keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        query = {"namespace": self.namespace}
+        if prefix:
+            query["key"] = {"$regex": f"^{re.escape(prefix)}"}
+        for document in self.collection.find(query, {"key": 1}):
+            yield document["key"]
+
+
+def make_byte_store(user_id: str, user_dir: str) -> ByteStore:
+    """
+    Create the byte store backing a user's docstore.
+
+    Args:
+        user_id (str): The user ID.
+        user_dir (str): The user's directory under DATA_DIR.
+
+    Returns:
+        ByteStore: A MongoByteStore if DOCSTORE_BACKEND is "mongodb", otherwise an AtomicFileStore.
+    """
+    if DOCSTORE_BACKEND == "mongodb":
+        return MongoByteStore(user_id)
+    return AtomicFileStore(os.path.join(user_dir, "data"))
+
+
+# Example usage
+if __name__ == "__main__":
+    import hashlib
+    import random
+    import tempfile
+    from multiprocessing import Pool
+
+    def worker(args):
+        root, worker_id, iterations = args
+        store = AtomicFileStore(os.path.join(root, "data"))
+        torn = 0
+        for i in range(iterations):
+            key = f"doc-{random.randint(0, 19)}"
+            payload = os.urandom(random.randint(1, 256 * 1024))
+            store.mset([(key, hashlib.sha256(payload).digest() + payload)])
+
+            value = store.mget([f"doc-{random.randint(0, 19)}"])[0]
+            if value is not None and hashlib.sha256(value[32:]).digest() != value[:32]:
+                torn += 1
+
+            with file_lock(os.path.join(root, ".counter.lock")):
+                counter = os.path.join(root, "counter")
+                count = int(open(counter).read()) if os.path.exists(counter) else 0
+                with open(counter, "w") as f:
+                    f.write(str(count + 1))
+        return torn
+
+    workers, iterations = 8, 200
+    with tempfile.TemporaryDirectory() as root:
+        with Pool(workers) as pool:
+            torn = sum(pool.map(worker, [(root, i, iterations) for i in range(workers)]))
+        count = int(open(os.path.join(root, "counter")).read())
+        keys = list(AtomicFileStore(os.path.join(root, "data")).yield_keys())
+
+    print(f"{workers} processes x {iterations} writes: {torn} torn reads, "
+          f"locked counter {count}/{workers * iterations}, {len(keys)} keys listed")
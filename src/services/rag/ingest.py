@@ -0,0 +1,277 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from src.config.config import EMBED_BATCH_SIZE, EMBED_CONCURRENCY, UPSERT_BATCH_SIZE, UPSERT_CONCURRENCY
+from src.services.governor.governor import governor, OPENAI_HOST, PINECONE_HOST
+from src.services.profiling.profiling import profiled, propagate
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+ID_KEY = "doc_id"
+
+
+def upsert_vectors(vectorstore, ids: List[str], vectors: List[List[float]], texts: List[str], metadatas: List[dict]) -> None:
+    """
+    Write already embedded chunks to a vector store without embedding them again.
+
+    Args:
+        vectorstore (VectorStore): A PineconeVectorStore or a store with an `add_vectors` method.
+        ids (List[str]): The chunk IDs.
+        vectors (List[List[float]]): The chunk embeddings.
+        texts (List[str]): The chunk texts.
+        metadatas (List[dict]): The chunk metadata.
+    """
+    if hasattr(vectorstore, "add_vectors"):
+        vectorstore.add_vectors(vectors, texts, metadatas=metadatas, ids=ids)
+        return
+
+    records = [
+        (id_, vector, dict(metadata, **{vectorstore._text_key: text}))
+        for id_, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+    ]
+    vectorstore._index.upsert(vectors=records, namespace=vectorstore._namespace)
+
+
+class IngestPipeline:
+    def __init__(self, vectorstore, docstore, embeddings, parent_splitter, child_splitter,
+                 batch_size: int = EMBED_BATCH_SIZE, embed_concurrency: int = EMBED_CONCURRENCY,
+                 upsert_batch_size: int = UPSERT_BATCH_SIZE, upsert_concurrency: int = UPSERT_CONCURRENCY,
+                 progress: Optional[Callable[[int, int], None]] = None):
+        self.vectorstore = vectorstore
+        self.docstore = docstore
+        self.embeddings = embeddings
+        self.parent_splitter = parent_splitter
+        self.child_splitter = child_splitter
+        self.batch_size = batch_size
+        self.embed_concurrency = embed_concurrency
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_concurrency = upsert_concurrency
+        self.progress = progress
+
+    @profiled("ingest.split")
+    def split(self, documents: List[Document]) -> tuple:
+        """
+        Split documents into parents and children with IDs that are stable across runs.
+
+        IDs depend only on each parent's position, page and content, not on metadata such as the path
+        the document was loaded from, so uploading the same file again yields the same IDs.
+
+        Args:
+            documents (List[Document]): The documents to split.
+
+        Returns:
+            tuple: The (parent ID, parent) pairs and the (child ID, child) pairs.
+        """
+        parents = []
+        children = []
+        for index, parent in enumerate(self.parent_splitter.split_documents(documents)):
+            digest = hashlib.sha1(f"{index}:{parent.metadata.get('page')}:{parent.page_content}".encode()).hexdigest()
+            parent_id = str(uuid.uuid5(uuid.NAMESPACE_OID, digest))
+            parents.append((parent_id, parent))
+
+            for child_index, child in enumerate(self.child_splitter.split_documents([parent])):
+                child.metadata[ID_KEY] = parent_id
+                children.append((str(uuid.uuid5(uuid.NAMESPACE_OID, f"{parent_id}:{child_index}")), child))
+        return parents, children
+
+    @profiled("ingest.embed")
+    def _embed(self, batch: List[tuple]) -> List[List[float]]:
+        texts = [child.page_content for _, child in batch]
+        return governor.call(OPENAI_HOST, self.embeddings.embed_documents, texts)
+
+    @profiled("ingest.upsert")
+    def _upsert(self, batch: List[tuple], vectors: List[List[float]]) -> None:
+        ids = [child_id for child_id, _ in batch]
+        texts = [child.page_content for _, child in batch]
+        metadatas = [child.metadata for _, child in batch]
+        governor.call(PINECONE_HOST, upsert_vectors, self.vectorstore, ids, vectors, texts, metadatas)
+
+    @profiled("ingest")
+    def ingest(self, documents: List[Document], checkpoint_path: Optional[str] = None) -> Dict:
+        """
+        Embed and upsert child chunks in concurrent batches, then store each parent once all of its children are committed.
+
+        Committed batches are recorded in the checkpoint file, so running the same documents again after a
+        failure only processes the batches that did not finish. On the first failure no further batches are
+        embedded, the batches already embedded are still committed, and the error is raised. The checkpoint
+        is removed on success.
+
+        Args:
+            documents (List[Document]): The documents to ingest.
+            checkpoint_path (Optional[str]): The checkpoint file, progress is not saved if None.
+
+        Returns:
+            Dict: The number of parents, children and children skipped thanks to the checkpoint.
+        """
+        parents, children = self.split(documents)
+        batches = [children[i:i + self.batch_size] for i in range(0, len(children), self.batch_size)]
+        batch_keys = [batch[0][0] for batch in batches]
+
+        committed = set()
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r") as f:
+                committed = set(json.load(f)["batches"])
+            logging.info(f"Resuming ingest, {len(committed)} of {len(batches)} batches already committed")
+
+        # Parents become visible in the docstore only once every batch holding one of their children is committed
+        pending_batches = {parent_id: set() for parent_id, _ in parents}
+        for key, batch in zip(batch_keys, batches):
+            if key not in committed:
+                for _, child in batch:
+                    pending_batches[child.metadata[ID_KEY]].add(key)
+        parent_docs = dict(parents)
+
+        def release(key: Optional[str] = None) -> None:
+            ready = []
+            for parent_id, keys in pending_batches.items():
+                keys.discard(key)
+                if not keys:
+                    ready.append(parent_id)
+            for parent_id in ready:
+                del pending_batches[parent_id]
+            if ready:
+                self.docstore.mset([(parent_id, parent_docs[parent_id]) for parent_id in ready])
+
+        def commit(key: str) -> None:
+            committed.add(key)
+            if checkpoint_path:
+                temp_path = f"{checkpoint_path}.tmp"
+                with open(temp_path, "w") as f:
+                    json.dump({"batches": sorted(committed)}, f)
+                os.replace(temp_path, checkpoint_path)
+            release(key)
+
+        # Parents whose children were all committed by a previous run
+        release()
+
+        todo = [(key, batch) for key, batch in zip(batch_keys, batches) if key not in committed]
+        skipped = len(children) - sum(len(batch) for _, batch in todo)
+        done = skipped
+
+        pending = iter(todo)
+        error = None
+
+        with ThreadPoolExecutor(max_workers=self.embed_concurrency) as embed_pool, \
+                ThreadPoolExecutor(max_workers=self.upsert_concurrency) as upsert_pool:
+            embedding = {}
+            upserting = {}
+            remaining = {}
+
+            def submit_embeds() -> None:
+                # Only embed_concurrency batches are in flight, so a failure stops the rest from being embedded
+                while len(embedding) < self.embed_concurrency:
+                    item = next(pending, None)
+                    if item is None:
+                        return
+                    embedding[embed_pool.submit(propagate(self._embed), item[1])] = item
+
+            submit_embeds()
+            while embedding or upserting:
+                finished, _ = wait(list(embedding) + list(upserting), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future in embedding:
+                        key, batch = embedding.pop(future)
+                        try:
+                            vectors = future.result()
+                        except Exception as e:
+                            error = error or e
+                            continue
+                        # Batches embedded before or during a failure are still upserted and checkpointed
+                        starts = range(0, len(batch), self.upsert_batch_size)
+                        remaining[key] = len(starts)
+                        for i in starts:
+                            upsert = upsert_pool.submit(propagate(self._upsert), batch[i:i + self.upsert_batch_size],
+                                                        vectors[i:i + self.upsert_batch_size])
+                            upserting[upsert] = (key, batch)
+                    else:
+                        key, batch = upserting.pop(future)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            error = error or e
+                            continue
+                        remaining[key] -= 1
+                        if remaining[key] == 0:
+                            commit(key)
+                            done += len(batch)
+                            logging.info(f"Ingested {done}/{len(children)} chunks")
+                            if self.progress:
+                                self.progress(done, len(children))
+
+                if error is None:
+                    submit_embeds()
+                else:
+                    embed_pool.shutdown(wait=False, cancel_futures=True)
+
+        if error is not None:
+            logging.error(f"Ingest stopped after {done}/{len(children)} chunks: {error}")
+            raise error
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        return {"parents": len(parents), "children": len(children), "skipped": skipped}
+
+
+# Example usage
+if __name__ == "__main__":
+    import time
+
+    from langchain.retrievers import ParentDocumentRetriever
+    from langchain.storage import InMemoryStore
+
+    from src.services.rag.local import HashingEmbeddings, InMemoryVectorStore
+    from src.services.rag.splitter import make_splitters
+
+    class SlowEmbeddings(HashingEmbeddings):
+        # One simulated round trip per embedding request
+        def embed_documents(self, texts):
+            time.sleep(0.05)
+            return super().embed_documents(texts)
+
+    class SlowVectorStore(InMemoryVectorStore):
+        # One simulated round trip per upsert request
+        def add_vectors(self, vectors, texts, metadatas=None, ids=None):
+            time.sleep(0.02)
+            return super().add_vectors(vectors, texts, metadatas=metadatas, ids=ids)
+
+        def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+            texts = list(texts)
+            vectors = []
+            for i in range(0, len(texts), 32):
+                vectors.extend(self.embedding.embed_documents(texts[i:i + 32]))
+            ids = ids or [str(uuid.uuid4()) for _ in texts]
+            metadatas = metadatas or [{} for _ in texts]
+            for i in range(0, len(texts), 32):
+                self.add_vectors(vectors[i:i + 32], texts[i:i + 32], metadatas=metadatas[i:i + 32], ids=ids[i:i + 32])
+            return ids
+
+    words = ["engineering", "systems", "delivery", "mission", "support", "integration", "analysis", "research"]
+    documents = [Document(page_content=" ".join(words[(i + j) % len(words)] for j in range(400)) + ".", metadata={"page": i})
+                 for i in range(40)]
+    parent_splitter, child_splitter = make_splitters("characters")
+
+    embeddings = SlowEmbeddings()
+    vectorstore = SlowVectorStore(embeddings)
+    retriever = ParentDocumentRetriever(vectorstore=vectorstore, docstore=InMemoryStore(),
+                                        child_splitter=child_splitter, parent_splitter=parent_splitter)
+    start = time.perf_counter()
+    retriever.add_documents(documents)
+    elapsed = time.perf_counter() - start
+    print(f"ParentDocumentRetriever: {len(vectorstore)} chunks in {elapsed:.2f}s, {len(vectorstore) / elapsed:.0f} chunks/s")
+
+    vectorstore = SlowVectorStore(embeddings)
+    pipeline = IngestPipeline(vectorstore, InMemoryStore(), embeddings, parent_splitter, child_splitter)
+    start = time.perf_counter()
+    pipeline.ingest(documents)
+    elapsed = time.perf_counter() - start
+    print(f"IngestPipeline: {len(vectorstore)} chunks in {elapsed:.2f}s, {len(vectorstore) / elapsed:.0f} chunks/s")
@@ -1,9 +1,12 @@
 from langchain_community.document_loaders import PyMuPDFLoader
 
+from src.services.profiling.profiling import profiled
+
 class Loader():
     def __init__(self):
         pass
         
+    @profiled("loader.load_document")
     def load_document(self, path):
         self.loader = PyMuPDFLoader(path)
         return self.loader.load()
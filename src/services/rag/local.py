@@ -0,0 +1,180 @@
+import re
+import threading
+import uuid
+import zlib
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Offline stand-in for OpenAIEmbeddings that hashes words into a fixed number of dimensions.
+
+    Texts sharing words get similar vectors, so retrieval quality can be compared between
+    configurations without calling the embeddings API.
+    """
+
+    def __init__(self, dimension: int = 1536):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            vector[zlib.crc32(word.encode()) % self.dimension] += 1
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    Offline stand-in for PineconeVectorStore that keeps vectors in memory and searches them by cosine similarity.
+
+    Like a Pinecone upsert, adding a text under an existing ID replaces it.
+    """
+
+    def __init__(self, embedding: Embeddings):
+        self.embedding = embedding
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.rows = {}
+        self.vectors = None
+        self.pending = []
+        self.updates = {}
+        self.lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def add_vectors(self, vectors: List[List[float]], texts: List[str], metadatas: Optional[List[dict]] = None,
+                    ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Add already embedded texts to the store, replacing those already stored under the same IDs.
+
+        Args:
+            vectors (List[List[float]]): The embeddings of the texts.
+            texts (List[str]): The texts.
+            metadatas (Optional[List[dict]]): Metadata of each text.
+            ids (Optional[List[str]]): IDs of each text, generated if None.
+
+        Returns:
+            List[str]: The IDs of the added texts.
+        """
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+
+        array = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        with self.lock:
+            added = []
+            for i, (id_, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                row = self.rows.get(id_)
+                if row is None:
+                    self.rows[id_] = len(self.ids)
+                    self.ids.append(id_)
+                    self.texts.append(text)
+                    self.metadatas.append(metadata)
+                    added.append(i)
+                else:
+                    self.texts[row] = text
+                    self.metadatas[row] = metadata
+                    self.updates[row] = array[i]
+            if added:
+                self.pending.append(array[added])
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        return self.add_vectors(self.embedding.embed_documents(texts), texts, metadatas=metadatas, ids=ids)
+
+    def _stack(self) -> Optional[np.ndarray]:
+        # Added vectors are stacked lazily so repeated adds stay linear, callers hold the lock
+        if self.pending:
+            arrays = self.pending if self.vectors is None else [self.vectors] + self.pending
+            self.vectors = np.vstack(arrays)
+            self.pending = []
+        if self.updates:
+            rows = list(self.updates)
+            self.vectors[rows] = np.stack([self.updates[row] for row in rows])
+            self.updates = {}
+        return self.vectors
+
+    def _matrix(self) -> Optional[np.ndarray]:
+        with self.lock:
+            return self._stack()
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids is None:
+            return False
+        with self.lock:
+            self._stack()
+            remove = set(ids)
+            keep = [i for i, id_ in enumerate(self.ids) if id_ not in remove]
+            self.ids = [self.ids[i] for i in keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self.rows = {id_: row for row, id_ in enumerate(self.ids)}
+            self.vectors = self.vectors[keep] if keep else None
+        return True
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        vectors = self._matrix()
+        if vectors is None:
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1)
+        scores = vectors @ query / np.where(norms == 0, 1, norms)
+
+        top = np.argsort(-scores)[:k]
+        return [Document(page_content=self.texts[i], metadata=self.metadatas[i]) for i in top]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k=k)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   **kwargs: Any) -> "InMemoryVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=kwargs.get("ids"))
+        return store
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def shared_store(namespace: str, embedding: Embeddings) -> InMemoryVectorStore:
+    """
+    Get the process-wide in-memory store of a namespace, like a Pinecone namespace that outlives each Retriever.
+
+    Args:
+        namespace (str): The namespace, e.g. a user ID.
+        embedding (Embeddings): Embeddings used if the store is created.
+
+    Returns:
+        InMemoryVectorStore: The namespace's store.
+    """
+    with _stores_lock:
+        if namespace not in _stores:
+            _stores[namespace] = InMemoryVectorStore(embedding)
+        return _stores[namespace]
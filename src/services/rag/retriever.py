@@ -1,20 +1,27 @@
-from src.config.config import CHILD_CHUNK_SIZE, PARENT_CHUNK_SIZE
+from src.config.config import DEFAULT_CHUNKING_PROFILE, DATA_DIR, VECTOR_STORE_BACKEND, EMBEDDINGS_BACKEND
 import logging
 from typing import List, Optional
 from pinecone import Pinecone, ServerlessSpec
 from langchain_pinecone import PineconeVectorStore
 from pinecone import Pinecone, ServerlessSpec
 from langchain.storage._lc_store import create_kv_docstore
-from langchain.storage import LocalFileStore
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain.retrievers import ParentDocumentRetriever
 
 from src.services.rag.loader import Loader
+from src.services.rag.splitter import make_splitters
+from src.services.rag.ingest import IngestPipeline
+from src.services.rag.docstore import make_byte_store, file_lock
+from src.services.rag.local import HashingEmbeddings, shared_store
+from src.services.profiling.profiling import profiled
 from src.config.creds import OPENAI_API_KEY, PINECONE_API_KEY
 from src.config.config import COMPANY_DATA_QUERY
+from src.services.profiling.profiling import propagate
 from src.services.llm.llm import extract_keywords
+from src.services.governor.governor import governor, OPENAI_HOST, PINECONE_HOST
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import os
 import time
 
@@ -24,67 +31,90 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 
 class Retriever:
-    def __init__(self, user_id):
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small", api_key=OPENAI_API_KEY)
+    @profiled("retriever.init")
+    def __init__(self, user_id, profile: str = DEFAULT_CHUNKING_PROFILE):
+        if EMBEDDINGS_BACKEND == "hashing":
+            self.embeddings = HashingEmbeddings()
+        else:
+            self.embeddings = OpenAIEmbeddings(model="text-embedding-3-small", api_key=OPENAI_API_KEY, max_retries=0)
 
-        self.parent_splitter = RecursiveCharacterTextSplitter(chunk_size=PARENT_CHUNK_SIZE)
-        self.child_splitter = RecursiveCharacterTextSplitter(chunk_size=CHILD_CHUNK_SIZE)
+        self.parent_splitter, self.child_splitter = make_splitters(profile)
         self.index_name = "company-data"
-        self.pc = Pinecone(
-            pinecone_api_key=PINECONE_API_KEY,
-        )
-        
-        
 
-        if self.index_name in self.pc.list_indexes().names():
-            self.vectorstore = PineconeVectorStore.from_existing_index(
-                index_name=self.index_name,
-                embedding=self.embeddings,
-                namespace=user_id,
-            )
+        if VECTOR_STORE_BACKEND == "memory":
+            # Local runs keep each user's vectors in this process instead of Pinecone
+            self.pc = None
+            self.vectorstore = shared_store(user_id, self.embeddings)
         else:
-            logging.info(f"Creating new index: {self.index_name}")
-            self.pc.create_index(
-                name=self.index_name,
-                dimension=1536,
-                metric="cosine",
-                spec=ServerlessSpec(
-                    cloud="aws",
-                    region="us-east-1",
-                    )
-            )
-                # wait for index to be initialized
-            while not self.pc.describe_index(self.index_name).status['ready']:
-                time.sleep(1)
-            self.vectorstore = PineconeVectorStore.from_existing_index(
-                index_name=self.index_name,
-                embedding=self.embeddings,
-                namespace=user_id,
+            self.pc = Pinecone(
+                pinecone_api_key=PINECONE_API_KEY,
             )
 
-        docstore_path = f"src/docstore/{user_id}/data"
-        if not os.path.exists(f"src/docstore/{user_id}"):
-            os.mkdir(f"src/docstore/{user_id}")
+            if self.index_name in self.pc.list_indexes().names():
+                self.vectorstore = PineconeVectorStore.from_existing_index(
+                    index_name=self.index_name,
+                    embedding=self.embeddings,
+                    namespace=user_id,
+                )
+            else:
+                logging.info(f"Creating new index: {self.index_name}")
+                self.pc.create_index(
+                    name=self.index_name,
+                    dimension=1536,
+                    metric="cosine",
+                    spec=ServerlessSpec(
+                        cloud="aws",
+                        region="us-east-1",
+                        )
+                )
+                    # wait for index to be initialized
+                while not self.pc.describe_index(self.index_name).status['ready']:
+                    time.sleep(1)
+                self.vectorstore = PineconeVectorStore.from_existing_index(
+                    index_name=self.index_name,
+                    embedding=self.embeddings,
+                    namespace=user_id,
+                )
+
+        self.user_dir = os.path.join(DATA_DIR, user_id)
+        os.makedirs(self.user_dir, exist_ok=True)
         
-        fs = LocalFileStore(docstore_path)
-        docstore = create_kv_docstore(fs)
+        self.docstore = create_kv_docstore(make_byte_store(user_id, self.user_dir))
         
         self.retriever = ParentDocumentRetriever(
             vectorstore=self.vectorstore,
-            docstore=docstore,
+            docstore=self.docstore,
+            child_splitter=self.child_splitter,
+            parent_splitter=self.parent_splitter,
+        )
+        
+        self.pipeline = IngestPipeline(
+            vectorstore=self.vectorstore,
+            docstore=self.docstore,
+            embeddings=self.embeddings,
             child_splitter=self.child_splitter,
             parent_splitter=self.parent_splitter,
         )
         
+    @profiled("retriever.add_documents")
     def add_documents(self, documents: List[str]) -> None:
         """
         Add documents to the retriever.
 
+        Child chunks are embedded and upserted in concurrent batches. An interrupted upload of the same
+        documents resumes from its checkpoint instead of starting over.
+
         Args:
             documents (List[str]): A list of documents to add to the retriever.
         """
-        self.retriever.add_documents(documents)
+        digest = hashlib.sha1("".join(doc.page_content for doc in documents).encode()).hexdigest()
+        checkpoint_path = os.path.join(self.user_dir, f"ingest-{digest}.json")
+
+        # Uploads for the same user are serialized across worker processes
+        with file_lock(os.path.join(self.user_dir, ".ingest.lock")):
+            self.pipeline.ingest(documents, checkpoint_path=checkpoint_path)
 
+    @profiled("retriever.get_query_docs")
     def get_query_docs(self, query: str, k: int = 1) -> Optional[str]:
         """
         Retrieve relevant documents based on the given query and documents.
@@ -99,8 +129,16 @@ class Retriever:
                 or None if no relevant documents are found.
         """
         try:
-            if self.index_name in self.pc.list_indexes().names():
-                relevant_docs = self.retriever.get_relevant_documents(query, k=k)
+            if self.pc is None or self.index_name in self.pc.list_indexes().names():
+                # Embedding and vector search go through their own hosts, so OpenAI throttling doesn't trip Pinecone
+                vector = governor.call(OPENAI_HOST, self.embeddings.embed_query, query)
+                sub_docs = governor.call(PINECONE_HOST, self.vectorstore.similarity_search_by_vector, vector,
+                                         **self.retriever.search_kwargs)
+
+                # Parent IDs in ranked order, like ParentDocumentRetriever
+                id_key = self.retriever.id_key
+                ids = list(dict.fromkeys(doc.metadata[id_key] for doc in sub_docs if id_key in doc.metadata))
+                relevant_docs = [doc for doc in self.docstore.mget(ids) if doc is not None]
 
                 if relevant_docs:
                     return '\n'.join([doc.page_content for doc in relevant_docs[:k]])
@@ -115,6 +153,68 @@ class Retriever:
             logging.error(f"Error retrieving documents: {e}")
             return None
     
+    @profiled("retriever.get_query_docs_many")
+    def get_query_docs_many(self, queries: List[str], k: int = 1) -> List[Optional[str]]:
+        """
+        Retrieve relevant documents for several queries in about one round trip.
+
+        All queries are embedded in one request and their vector searches run concurrently. Parent
+        documents found by several queries are read once, in a single docstore read. Each query gets the
+        same result `get_query_docs` would return for it.
+
+        Args:
+            queries (List[str]): The query strings.
+            k (int): The number of relevant documents to retrieve per query (default: 1).
+
+        Returns:
+            List[Optional[str]]: For each query, the concatenated page content of its relevant documents,
+                or None if no relevant documents are found.
+        """
+        if not queries:
+            return []
+
+        try:
+            if self.pc is not None and self.index_name not in self.pc.list_indexes().names():
+                logging.warning("Index does not exist for the user.")
+                return [None] * len(queries)
+
+            vectors = governor.call(OPENAI_HOST, self.embeddings.embed_documents, list(queries))
+
+            def search_vector(vector):
+                return governor.call(PINECONE_HOST, self.vectorstore.similarity_search_by_vector, vector,
+                                     **self.retriever.search_kwargs)
+
+            with ThreadPoolExecutor(max_workers=len(vectors)) as executor:
+                children = list(executor.map(propagate(search_vector), vectors))
+
+            # Parent IDs per query in ranked order, like ParentDocumentRetriever
+            id_key = self.retriever.id_key
+            query_ids = []
+            for sub_docs in children:
+                ids = []
+                for doc in sub_docs:
+                    if id_key in doc.metadata and doc.metadata[id_key] not in ids:
+                        ids.append(doc.metadata[id_key])
+                query_ids.append(ids)
+
+            unique_ids = list(dict.fromkeys(id for ids in query_ids for id in ids))
+            parents = dict(zip(unique_ids, self.docstore.mget(unique_ids)))
+
+            results = []
+            for query, ids in zip(queries, query_ids):
+                relevant_docs = [parents[id] for id in ids if parents[id] is not None]
+                if relevant_docs:
+                    results.append('\n'.join([doc.page_content for doc in relevant_docs[:k]]))
+                else:
+                    logging.warning(f"No relevant documents found for the query: {query}")
+                    results.append(None)
+            return results
+
+        except Exception as e:
+            logging.error(f"Error retrieving documents: {e}")
+            return [None] * len(queries)
+
+    @profiled("retriever.get_keywords")
     def get_keywords(self, max_length: int) -> None:
         """
         Extract keywords from a company description using a language model.
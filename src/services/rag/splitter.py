@@ -0,0 +1,59 @@
+from typing import Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from src.config.config import CHUNKING_PROFILES, TOKEN_ENCODING
+
+
+# Section breaks first, then lines, then sentence ends, then words
+TOKEN_SEPARATORS = ["\n\n", "\n", r"(?<=[.!?;])\s+", " ", ""]
+
+
+def make_splitter(mode: str, size: int, overlap: int = None) -> RecursiveCharacterTextSplitter:
+    """
+    Create a text splitter that sizes chunks in characters or in tokens.
+
+    Token splitters measure chunks with tiktoken and prefer to break on section, line and
+    sentence boundaries before falling back to words.
+
+    Args:
+        mode (str): Either "characters" or "tokens".
+        size (int): The chunk size, in characters or tokens.
+        overlap (int): The chunk overlap, the splitter's default is used if None.
+
+    Returns:
+        RecursiveCharacterTextSplitter: The text splitter.
+    """
+    kwargs = {"chunk_size": size}
+    if overlap is not None:
+        kwargs["chunk_overlap"] = overlap
+
+    if mode == "characters":
+        return RecursiveCharacterTextSplitter(**kwargs)
+    if mode == "tokens":
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=TOKEN_ENCODING,
+            separators=TOKEN_SEPARATORS,
+            is_separator_regex=True,
+            **kwargs,
+        )
+    raise ValueError(f"Unknown chunking mode: {mode}")
+
+
+def make_splitters(profile: str) -> Tuple[RecursiveCharacterTextSplitter, RecursiveCharacterTextSplitter]:
+    """
+    Create the parent and child splitters of a chunking profile.
+
+    Args:
+        profile (str): The name of a profile in CHUNKING_PROFILES.
+
+    Returns:
+        Tuple[RecursiveCharacterTextSplitter, RecursiveCharacterTextSplitter]: The parent and child splitters.
+    """
+    if profile not in CHUNKING_PROFILES:
+        raise ValueError(f"Unknown chunking profile: {profile}")
+
+    config = CHUNKING_PROFILES[profile]
+    parent_splitter = make_splitter(config["mode"], config["parent_size"], config["overlap"])
+    child_splitter = make_splitter(config["mode"], config["child_size"], config["overlap"])
+    return parent_splitter, child_splitter
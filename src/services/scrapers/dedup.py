@@ -0,0 +1,134 @@
+import logging
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+from src.config.config import DEDUP_SHINGLE_SIZE, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_THRESHOLD
+from src.services.profiling.profiling import profiled
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+_generator = np.random.RandomState(1)
+PERMUTATIONS_A = _generator.randint(1, 1 << 32, size=DEDUP_NUM_PERM, dtype=np.uint64)
+PERMUTATIONS_B = _generator.randint(0, 1 << 32, size=DEDUP_NUM_PERM, dtype=np.uint64)
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def shingles(text: str, size: int = DEDUP_SHINGLE_SIZE) -> np.ndarray:
+    """
+    Hash the word shingles of a text.
+
+    Args:
+        text (str): The text to shingle.
+        size (int): Number of words per shingle.
+
+    Returns:
+        np.ndarray: The distinct 32-bit shingle hashes.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    hashes = {zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def minhash(text: str) -> np.ndarray:
+    """
+    Compute the MinHash signature of a text.
+
+    Args:
+        text (str): The text to sign.
+
+    Returns:
+        np.ndarray: The signature, one value per permutation.
+    """
+    hashes = shingles(text)
+    permuted = (np.outer(hashes, PERMUTATIONS_A) + PERMUTATIONS_B) % MERSENNE_PRIME & MAX_HASH
+    return permuted.min(axis=0)
+
+
+def cluster(texts: List[str]) -> List[List[int]]:
+    """
+    Group near-duplicate texts using MinHash signatures and locality-sensitive hashing.
+
+    Texts sharing an LSH band are compared by estimated Jaccard similarity and merged into the same
+    cluster when it reaches DEDUP_THRESHOLD.
+
+    Args:
+        texts (List[str]): The texts to cluster.
+
+    Returns:
+        List[List[int]]: Clusters of text indices, ordered by their first member.
+    """
+    signatures = [minhash(text) for text in texts]
+    rows = DEDUP_NUM_PERM // DEDUP_BANDS
+
+    parents = list(range(len(texts)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for band in range(DEDUP_BANDS):
+        buckets = defaultdict(list)
+        for i, signature in enumerate(signatures):
+            buckets[signature[band * rows:(band + 1) * rows].tobytes()].append(i)
+
+        for members in buckets.values():
+            for position, other in enumerate(members[1:], start=1):
+                for first in members[:position]:
+                    root, other_root = find(first), find(other)
+                    if root == other_root:
+                        break
+                    if np.mean(signatures[first] == signatures[other]) >= DEDUP_THRESHOLD:
+                        parents[max(root, other_root)] = min(root, other_root)
+                        break
+
+    clusters = defaultdict(list)
+    for i in range(len(texts)):
+        clusters[find(i)].append(i)
+    return list(clusters.values())
+
+
+@profiled("dedup")
+def deduplicate(listings: List[Dict]) -> List[Dict]:
+    """
+    Collapse near-duplicate listings into one representative per cluster.
+
+    The first listing of each cluster is kept and the others are attached to it, without their
+    descriptions, under `variants`. Variants of already deduplicated listings are carried over.
+
+    Args:
+        listings (List[Dict]): Listings with `title` and `description` keys.
+
+    Returns:
+        List[Dict]: The representative listings.
+    """
+    if not listings:
+        return listings
+
+    clusters = cluster([listing['title'] + " " + listing['description'] for listing in listings])
+
+    results = []
+    for members in clusters:
+        representative = listings[members[0]]
+        variants = representative.get('variants', [])
+        for i in members[1:]:
+            variants.append({key: value for key, value in listings[i].items() if key not in ('description', 'variants')})
+            variants.extend(listings[i].get('variants', []))
+        representative['variants'] = variants
+        results.append(representative)
+
+    logging.info(f"Deduplicated {len(listings)} listings into {len(results)} clusters")
+    return results
@@ -0,0 +1,486 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from array import array
+from collections import Counter
+from dataclasses import replace
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from src.config.config import INDEX_PATH, INDEX_SAVE_INTERVAL, BM25_K1, BM25_B
+from src.services.profiling.profiling import profiled
+from src.services.rag.docstore import file_lock
+from src.services.scrapers.opportunity import Opportunity
+from src.services.scrapers.query import parse_query
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+WORD_PATTERN = re.compile(r'\w+')
+NO_DATE = -1
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase words.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        List[str]: The words.
+    """
+    return WORD_PATTERN.findall(text.lower())
+
+
+def _close_day(opportunity: Opportunity) -> int:
+    try:
+        return datetime.strptime(opportunity.close_date, '%m-%d-%Y').toordinal()
+    except (TypeError, ValueError):
+        return NO_DATE
+
+
+class OpportunityIndex:
+    """
+    Inverted index over the title and description of scraped opportunities, ranked with BM25.
+
+    Each word's postings are two growable int32 arrays of document numbers and term frequencies, read
+    as numpy arrays at query time. Deleted documents are only marked dead and their postings are dropped
+    by `compact`, which runs once a quarter of the documents are dead. Opportunities are keyed by link,
+    so adding a link again replaces the stored opportunity.
+
+    Every worker process keeps its own index. Additions and deletions since the last save are kept in
+    `changes`, and `save` applies them to the index on disk under a file lock, so workers sharing a
+    file merge their documents instead of overwriting each other's.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.lock = threading.RLock()
+        self.postings = {}
+        self.opportunities = []
+        self.lengths = array('i')
+        self.platforms = array('i')
+        self.close_dates = array('i')
+        self.platform_codes = {}
+        self.alive = bytearray()
+        self.numbers = {}
+        self.total_length = 0
+        self.changes = {}
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __contains__(self, link: str) -> bool:
+        return link in self.numbers
+
+    @profiled("index.add")
+    def add(self, opportunities: List[Opportunity]) -> None:
+        """
+        Index opportunities, replacing those already indexed under the same link.
+
+        Ratings and variants are not stored, since they depend on the user and the query.
+
+        Args:
+            opportunities (List[Opportunity]): The opportunities.
+        """
+        with self.lock:
+            for opportunity in opportunities:
+                self.changes[opportunity.link] = self._add(replace(opportunity, rating=None, variants=[]))
+            self.dirty = True
+
+    def _add(self, opportunity: Opportunity) -> Opportunity:
+        self._delete(opportunity.link)
+
+        number = len(self.opportunities)
+        words = tokenize(opportunity.title + " " + opportunity.description)
+        for word, frequency in Counter(words).items():
+            documents = self.postings.get(word)
+            if documents is None:
+                documents = self.postings[word] = (array('i'), array('i'))
+            documents[0].append(number)
+            documents[1].append(frequency)
+
+        self.opportunities.append(opportunity)
+        self.lengths.append(len(words))
+        self.platforms.append(self.platform_codes.setdefault(opportunity.platform, len(self.platform_codes)))
+        self.close_dates.append(_close_day(opportunity))
+        self.alive.append(1)
+        self.numbers[opportunity.link] = number
+        self.total_length += len(words)
+        return opportunity
+
+    def delete(self, links: List[str]) -> None:
+        """
+        Remove opportunities from the index.
+
+        Args:
+            links (List[str]): Links of the opportunities.
+        """
+        with self.lock:
+            for link in links:
+                self._delete(link)
+                self.changes[link] = None
+            self.dirty = True
+            self._maybe_compact()
+
+    def expire(self, today: Optional[date] = None) -> int:
+        """
+        Remove the opportunities that closed before a day. Opportunities without a close date are kept.
+
+        Args:
+            today (Optional[date]): The day, the current date if None.
+
+        Returns:
+            int: The number of opportunities removed.
+        """
+        today = (today or date.today()).toordinal()
+        with self.lock:
+            days = np.frombuffer(self.close_dates, dtype=np.int32)
+            live = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+            expired = np.flatnonzero(live & (days != NO_DATE) & (days < today))
+            links = [self.opportunities[number].link for number in expired.tolist()]
+            if links:
+                self.delete(links)
+        return len(links)
+
+    def _maybe_compact(self) -> None:
+        if len(self.opportunities) > 1000 and len(self.numbers) < 0.75 * len(self.opportunities):
+            self.compact()
+
+    def _delete(self, link: str) -> None:
+        number = self.numbers.pop(link, None)
+        if number is not None:
+            self.alive[number] = 0
+            self.opportunities[number] = None
+            self.total_length -= self.lengths[number]
+
+    def _apply(self, changes: Dict[str, Optional[Opportunity]]) -> None:
+        # Replay additions and deletions recorded by another index, without recording them as changes
+        for link, opportunity in changes.items():
+            if opportunity is None:
+                self._delete(link)
+            else:
+                self._add(opportunity)
+        self._maybe_compact()
+
+    def compact(self) -> None:
+        """
+        Renumber the live documents and drop the postings of deleted ones.
+        """
+        with self.lock:
+            live = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+            renumber = np.cumsum(live, dtype=np.int32) - 1
+
+            postings = {}
+            for word, (numbers, frequencies) in self.postings.items():
+                numbers = np.frombuffer(numbers, dtype=np.int32)
+                keep = live[numbers]
+                if keep.any():
+                    postings[word] = (array('i', renumber[numbers[keep]].tobytes()),
+                                      array('i', np.frombuffer(frequencies, dtype=np.int32)[keep].tobytes()))
+
+            self.postings = postings
+            self.opportunities = [opportunity for opportunity in self.opportunities if opportunity is not None]
+            self.lengths = array('i', np.frombuffer(self.lengths, dtype=np.int32)[live].tobytes())
+            self.platforms = array('i', np.frombuffer(self.platforms, dtype=np.int32)[live].tobytes())
+            self.close_dates = array('i', np.frombuffer(self.close_dates, dtype=np.int32)[live].tobytes())
+            self.alive = bytearray(b'\x01' * len(self.opportunities))
+            self.numbers = {opportunity.link: number for number, opportunity in enumerate(self.opportunities)}
+
+    def _term_documents(self, term: str, live: np.ndarray) -> np.ndarray:
+        # A multi-word term matches documents containing all of its words
+        matched = None
+        for word in tokenize(term):
+            documents = self.postings.get(word)
+            if documents is None:
+                return np.empty(0, dtype=np.int32)
+            numbers = np.frombuffer(documents[0], dtype=np.int32)
+            numbers = numbers[live[numbers]]
+            matched = numbers if matched is None else np.intersect1d(matched, numbers, assume_unique=True)
+        return matched if matched is not None else np.empty(0, dtype=np.int32)
+
+    def _match(self, tree: Tuple, live: np.ndarray) -> np.ndarray:
+        if tree[0] == "term":
+            return self._term_documents(tree[1], live)
+
+        matched = [self._match(operand, live) for operand in tree[1]]
+        result = matched[0]
+        for documents in matched[1:]:
+            if tree[0] == "and":
+                result = np.intersect1d(result, documents, assume_unique=True)
+            else:
+                result = np.union1d(result, documents)
+        return result
+
+    @profiled("index.search")
+    def search(self, query: str, platform: Optional[str] = None, date_from: Optional[datetime] = None,
+               date_to: Optional[datetime] = None, limit: Optional[int] = None) -> List[Opportunity]:
+        """
+        Answer a boolean keyword query, ranking the matching opportunities by BM25 over all query words.
+        Opportunities that have already closed are never returned.
+
+        Args:
+            query (str): Boolean keyword query, in the syntax of `parse_query`.
+            platform (Optional[str]): Only return opportunities of this platform.
+            date_from (Optional[datetime]): Start date for the closing date range.
+            date_to (Optional[datetime]): End date for the closing date range.
+            limit (Optional[int]): Maximum number of opportunities to return, all matches if None.
+
+        Returns:
+            List[Opportunity]: Copies of the matching opportunities, best match first.
+        """
+        tree = parse_query(query)
+        if tree is None:
+            return []
+
+        with self.lock:
+            live = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+            matched = self._match(tree, live)
+            if platform is not None:
+                code = self.platform_codes.get(platform, -1)
+                matched = matched[np.frombuffer(self.platforms, dtype=np.int32)[matched] == code]
+            # Opportunities without a close date match any range, like Opportunity.closes_between
+            days = np.frombuffer(self.close_dates, dtype=np.int32)[matched]
+            # Listings that closed since the last expire are already gone from the platforms
+            keep = days >= date.today().toordinal()
+            if date_from and date_to:
+                keep &= (days >= date_from.toordinal()) & (days <= date_to.toordinal())
+            matched = matched[(days == NO_DATE) | keep]
+            if not len(matched):
+                return []
+
+            scores = self._bm25(query, matched)
+            order = np.argsort(-scores, kind='stable')
+            if limit is not None:
+                order = order[:limit]
+            return [self.opportunities[number].copy() for number in matched[order]]
+
+    def _bm25(self, query: str, matched: np.ndarray) -> np.ndarray:
+        count = len(self.numbers)
+        average_length = self.total_length / count
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths[matched] / average_length)
+
+        scores = np.zeros(len(matched), dtype=np.float64)
+        for word in set(tokenize(query)) - {"and", "or"}:
+            documents = self.postings.get(word)
+            if documents is None:
+                continue
+            numbers = np.frombuffer(documents[0], dtype=np.int32)
+            frequencies = np.frombuffer(documents[1], dtype=np.int32)
+            live = np.frombuffer(self.alive, dtype=np.uint8)[numbers].astype(bool)
+            frequency = np.count_nonzero(live)
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+
+            # Term frequency of the word in each matched document, 0 where absent
+            positions = np.searchsorted(numbers, matched)
+            positions[positions == len(numbers)] = 0
+            tf = np.where(numbers[positions] == matched, frequencies[positions], 0)
+            scores += idf * tf * (BM25_K1 + 1) / (tf + norms)
+        return scores
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Merge the changes since the last save into the index on disk, then take on the merged index.
+
+        The file is locked for the whole read-merge-write, so concurrent saves from other worker processes
+        are serialized and none of their documents are lost. Changes made while saving are kept for the
+        next save.
+
+        Args:
+            path (Optional[str]): The file, the index's own path if None.
+        """
+        path = path or self.path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        with file_lock(f"{path}.lock"):
+            with self.lock:
+                changes, self.changes = self.changes, {}
+                self.dirty = False
+            try:
+                if os.path.exists(path):
+                    merged = OpportunityIndex.load(path)
+                    merged._apply(changes)
+                else:
+                    merged = self
+                merged._write(path)
+            except Exception:
+                with self.lock:
+                    for link, opportunity in changes.items():
+                        self.changes.setdefault(link, opportunity)
+                    self.dirty = True
+                raise
+
+        if merged is not self:
+            with self.lock:
+                late = self.changes
+                for name in ("postings", "opportunities", "lengths", "platforms", "close_dates", "platform_codes",
+                             "alive", "numbers", "total_length"):
+                    setattr(self, name, getattr(merged, name))
+                self._apply(late)
+
+    def _write(self, path: str) -> None:
+        # Replace the file atomically, so readers never see a partial index
+        with self.lock:
+            self.compact()
+            words = list(self.postings)
+            sizes = np.array([len(self.postings[word][0]) for word in words], dtype=np.int64)
+            numbers = b"".join(self.postings[word][0].tobytes() for word in words)
+            frequencies = b"".join(self.postings[word][1].tobytes() for word in words)
+            documents = orjson.dumps([opportunity.to_dict() for opportunity in self.opportunities])
+            lengths = self.lengths.tobytes()
+
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                np.savez(f, words=np.frombuffer(orjson.dumps(words), dtype=np.uint8), sizes=sizes,
+                         numbers=np.frombuffer(numbers, dtype=np.int32), frequencies=np.frombuffer(frequencies, dtype=np.int32),
+                         lengths=np.frombuffer(lengths, dtype=np.int32), documents=np.frombuffer(documents, dtype=np.uint8))
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @classmethod
+    def load(cls, path: str) -> "OpportunityIndex":
+        """
+        Read an index saved with `save`, or start an empty one if the file does not exist.
+
+        Args:
+            path (str): The file.
+
+        Returns:
+            OpportunityIndex: The index.
+        """
+        index = cls(path)
+        if not os.path.exists(path):
+            return index
+
+        with np.load(path) as data:
+            words = orjson.loads(data["words"].tobytes())
+            offsets = np.concatenate(([0], np.cumsum(data["sizes"])))
+            numbers, frequencies = data["numbers"], data["frequencies"]
+            for word, start, end in zip(words, offsets[:-1], offsets[1:]):
+                index.postings[word] = (array('i', numbers[start:end].tobytes()), array('i', frequencies[start:end].tobytes()))
+            index.lengths = array('i', data["lengths"].tobytes())
+            documents = orjson.loads(data["documents"].tobytes())
+
+        index.opportunities = [Opportunity(**document) for document in documents]
+        for opportunity in index.opportunities:
+            index.platforms.append(index.platform_codes.setdefault(opportunity.platform, len(index.platform_codes)))
+            index.close_dates.append(_close_day(opportunity))
+        index.alive = bytearray(b'\x01' * len(index.opportunities))
+        index.numbers = {opportunity.link: number for number, opportunity in enumerate(index.opportunities)}
+        index.total_length = int(np.frombuffer(index.lengths, dtype=np.int32).sum())
+        logging.info(f"Loaded {len(index)} opportunities from {path}")
+        return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def opportunity_index() -> OpportunityIndex:
+    """
+    Get the process-wide opportunity index, loading it from INDEX_PATH on first use.
+
+    Returns:
+        OpportunityIndex: The index.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = OpportunityIndex.load(INDEX_PATH)
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Error loading the opportunity index, starting empty: {e}")
+                _index = OpportunityIndex(INDEX_PATH)
+        return _index
+
+
+async def save_periodically(index: OpportunityIndex, interval: float = INDEX_SAVE_INTERVAL) -> None:
+    """
+    Remove expired opportunities from the index every interval, and save it while it has unsaved changes,
+    off the request path.
+
+    Args:
+        index (OpportunityIndex): The index.
+        interval (float): Seconds between saves.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        expired = await asyncio.to_thread(index.expire)
+        if expired:
+            logging.info(f"Removed {expired} expired opportunities from the index")
+        if index.dirty:
+            try:
+                await asyncio.to_thread(index.save)
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Error saving the opportunity index: {e}")
+
+
+# Example usage
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    generator = random.Random(0)
+    vocabulary = [f"w{i}" for i in range(20000)]
+    # Zipf-like word frequencies, as in natural text
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+    count = 100000
+    titles = [" ".join(generator.choices(vocabulary, weights=weights, k=8)) for _ in range(count)]
+    descriptions = [" ".join(generator.choices(vocabulary, weights=weights, k=120)) for _ in range(count)]
+    opportunities = [Opportunity(platform=generator.choice(["sbir.gov", "sam.gov"]), title=titles[i],
+                                 link=f"https://sam.gov/opp/{i}/view", description=descriptions[i], status="active")
+                     for i in range(count)]
+
+    index = OpportunityIndex()
+    start = time.perf_counter()
+    for i in range(0, count, 1000):
+        index.add(opportunities[i:i + 1000])
+    print(f"indexed {count} opportunities in {time.perf_counter() - start:.1f}s, {len(index.postings)} words")
+
+    queries = {
+        "common word": "w1",
+        "rare word": "w5000",
+        "two-word term": "w10 w200",
+        "OR": "w50 OR w300 OR w2000",
+        "AND": "w3 AND w40",
+        "mixed": "(w7 OR w90) AND w15",
+    }
+    for name, query in queries.items():
+        latencies = []
+        for _ in range(50):
+            start = time.perf_counter()
+            results = index.search(query, limit=100)
+            latencies.append(time.perf_counter() - start)
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        matched = len(index.search(query))
+        print(f"{name:>14} {query!r:>24}: {matched:>6} matches, p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+    start = time.perf_counter()
+    index.delete([opportunity.link for opportunity in opportunities[:30000]])
+    print(f"deleted 30000 opportunities and compacted in {time.perf_counter() - start:.2f}s, {len(index)} left")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "opportunities.npz")
+        start = time.perf_counter()
+        index.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = OpportunityIndex.load(path)
+        print(f"saved {os.path.getsize(path) / 1e6:.1f} MB in {saved:.2f}s, loaded in {time.perf_counter() - start:.2f}s")
+        assert [o.link for o in loaded.search("w3 AND w40", limit=10)] == [o.link for o in index.search("w3 AND w40", limit=10)]
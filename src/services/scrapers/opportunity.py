@@ -0,0 +1,193 @@
+import sys
+from functools import cached_property
+from dataclasses import dataclass, field, fields, asdict, replace
+from datetime import date, datetime
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+
+
+@dataclass(slots=True)
+class Opportunity:
+    """
+    A scraped opportunity shared by every platform.
+
+    The platform and status strings are interned, since they repeat across every listing. Dict-style
+    access is supported so listings can still be handled as mappings, e.g. `opportunity['rating']`.
+    """
+    platform: str
+    title: str
+    link: str
+    description: str
+    rating: Optional[int] = None
+    status: Optional[str] = None
+    open_date: Optional[str] = None
+    release_date: Optional[str] = None
+    due_date: Optional[str] = None
+    close_date: Optional[str] = None
+    variants: list = field(default_factory=list)
+
+    def __post_init__(self):
+        self.platform = sys.intern(self.platform)
+        if self.status is not None:
+            self.status = sys.intern(self.status)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in FIELD_NAMES:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in FIELD_NAMES
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in FIELD_NAMES else default
+
+    def keys(self) -> List[str]:
+        return FIELD_NAMES
+
+    def items(self) -> Iterator[tuple]:
+        return ((name, getattr(self, name)) for name in FIELD_NAMES)
+
+    def copy(self) -> "Opportunity":
+        return replace(self, variants=list(self.variants))
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def closes_between(self, date_from: datetime, date_to: datetime) -> bool:
+        """
+        Check whether the opportunity closes within a date range. Opportunities without a close date match.
+
+        Args:
+            date_from (datetime): Start of the range.
+            date_to (datetime): End of the range.
+
+        Returns:
+            bool: Whether the close date is unknown or within the range.
+        """
+        close_date = _parse_date(self.close_date)
+        return close_date is None or date_from.date() <= close_date <= date_to.date()
+
+
+FIELD_NAMES = [f.name for f in fields(Opportunity)]
+
+
+class OpportunityBatch:
+    """
+    Columnar view of a list of opportunities for scoring and ranking.
+
+    Ratings are held in a numpy array, set by scoring or built from the opportunities when first used,
+    and ranking is an argsort on it. Texts are read from the opportunities when needed.
+    """
+
+    def __init__(self, opportunities: List[Opportunity]):
+        self.opportunities = opportunities
+
+    @cached_property
+    def ratings(self) -> np.ndarray:
+        """
+        Ratings of the opportunities, NaN where unrated.
+
+        Returns:
+            np.ndarray: The ratings as float32.
+        """
+        return np.array([np.nan if opportunity.rating is None else opportunity.rating for opportunity in self.opportunities],
+                        dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.opportunities)
+
+    def texts(self) -> List[str]:
+        """
+        Get the text used for scoring each opportunity.
+
+        Returns:
+            List[str]: The title and description of each opportunity.
+        """
+        return [opportunity.title + " " + opportunity.description for opportunity in self.opportunities]
+
+    def set_ratings(self, ratings: List[int]) -> None:
+        """
+        Store ratings in the batch and on the opportunities.
+
+        Args:
+            ratings (List[int]): One rating per opportunity.
+        """
+        self.ratings = np.asarray(ratings, dtype=np.float32)
+        for opportunity, rating in zip(self.opportunities, ratings):
+            opportunity.rating = rating
+
+    def ranking(self) -> np.ndarray:
+        """
+        Order the opportunities by rating, highest first, with unrated opportunities last.
+
+        Returns:
+            np.ndarray: Indices of the opportunities in ranked order.
+        """
+        return np.argsort(-np.nan_to_num(self.ratings, nan=-np.inf), kind='stable')
+
+    def ranked(self) -> List[Opportunity]:
+        """
+        Get the opportunities in ranked order.
+
+        Returns:
+            List[Opportunity]: The ranked opportunities.
+        """
+        # A list index is much cheaper per item than a numpy integer
+        return [self.opportunities[i] for i in self.ranking().tolist()]
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    try:
+        return datetime.strptime(value, '%m-%d-%Y').date()
+    except (TypeError, ValueError):
+        return None
+
+
+# Example usage
+if __name__ == "__main__":
+    import random
+    import time
+    import tracemalloc
+
+    words = ["technology", "construction", "research", "defense", "energy", "software", "manufacturing", "support"]
+
+    for count in (10000, 100000):
+        descriptions = [" ".join(random.choices(words, k=50)) for _ in range(count)]
+        ratings = [random.randint(0, 100) for _ in range(count)]
+        close_dates = [f"{random.randint(1, 12):02d}-{random.randint(1, 28):02d}-2024" for _ in range(count)]
+
+        for name, make in (
+            ("dict", lambda i: {'platform': "sam.gov", 'title': f"Opportunity {i}", 'link': f"https://sam.gov/opp/{i}/view",
+                                'description': descriptions[i], 'rating': ratings[i], 'status': "active",
+                                'close_date': close_dates[i]}),
+            ("Opportunity", lambda i: Opportunity("sam.gov", f"Opportunity {i}", f"https://sam.gov/opp/{i}/view",
+                                                  descriptions[i], rating=ratings[i], status="active",
+                                                  close_date=close_dates[i])),
+        ):
+            tracemalloc.start()
+            records = [make(i) for i in range(count)]
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{count} x {name}: {peak / 1e6:.1f} MB peak, excluding the shared description strings")
+
+            if name == "dict":
+                start = time.perf_counter()
+                sorted(records, key=lambda x: x['rating'], reverse=True)
+                print(f"    sort by rating: {(time.perf_counter() - start) * 1000:.1f} ms")
+            else:
+                start = time.perf_counter()
+                batch = OpportunityBatch(records)
+                batch.set_ratings(ratings)
+                batch.ranked()
+                print(f"    batch construction, set_ratings and argsort ranking: {(time.perf_counter() - start) * 1000:.1f} ms")
+                start = time.perf_counter()
+                sorted(records, key=lambda x: x.rating, reverse=True)
+                print(f"    sort by rating: {(time.perf_counter() - start) * 1000:.1f} ms")
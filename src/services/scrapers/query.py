@@ -0,0 +1,241 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from src.config.config import TERM_CACHE_TTL, TERM_CACHE_SIZE, TERM_FETCH_WORKERS
+from src.services.profiling.profiling import profiled, propagate
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+TOKEN_PATTERN = re.compile(r'\(|\)|"[^"]*"|[^\s()"]+')
+OPERATORS = {"AND", "OR"}
+
+
+def normalize_term(term: str) -> str:
+    """
+    Normalize a search term so equivalent terms share a cache entry.
+
+    Args:
+        term (str): The raw search term.
+
+    Returns:
+        str: The normalized search term.
+    """
+    return " ".join(term.strip('"').lower().split())
+
+
+def parse_query(query: str) -> Optional[Tuple]:
+    """
+    Parse a boolean keyword query such as `KEYWORD1 OR KEYWORD2 AND KEYWORD3` into an expression tree.
+
+    AND binds tighter than OR and parentheses are supported. Adjacent words without an operator
+    between them form a single multi-word term.
+
+    Args:
+        query (str): The query string.
+
+    Returns:
+        Optional[Tuple]: The expression tree, made of ("term", str), ("and", list) and ("or", list) nodes,
+            or None if the query has no terms.
+    """
+    tokens = TOKEN_PATTERN.findall(query)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def parse_or():
+        nonlocal position
+        operands = [parse_and()]
+        while peek() is not None and peek().upper() == "OR":
+            position += 1
+            operands.append(parse_and())
+        return _combine("or", operands)
+
+    def parse_and():
+        nonlocal position
+        operands = [parse_term()]
+        while peek() is not None and peek().upper() == "AND":
+            position += 1
+            operands.append(parse_term())
+        return _combine("and", operands)
+
+    def parse_term():
+        nonlocal position
+        if peek() == "(":
+            position += 1
+            node = parse_or()
+            if peek() == ")":
+                position += 1
+            return node
+
+        words = []
+        while peek() is not None and peek() not in ("(", ")") and peek().upper() not in OPERATORS:
+            words.append(peek())
+            position += 1
+        term = normalize_term(" ".join(words))
+        return ("term", term) if term else None
+
+    tree = parse_or()
+    if position < len(tokens):
+        logging.warning(f"Ignoring unparsed query tokens: {tokens[position:]}")
+    return tree
+
+
+def _combine(operator: str, operands: List[Optional[Tuple]]) -> Optional[Tuple]:
+    operands = [operand for operand in operands if operand is not None]
+    if not operands:
+        return None
+    if len(operands) == 1:
+        return operands[0]
+    return (operator, operands)
+
+
+def query_terms(tree: Optional[Tuple]) -> List[str]:
+    """
+    List the distinct terms of an expression tree in query order.
+
+    Args:
+        tree (Optional[Tuple]): The expression tree.
+
+    Returns:
+        List[str]: The distinct terms.
+    """
+    if tree is None:
+        return []
+    if tree[0] == "term":
+        return [tree[1]]
+
+    terms = []
+    for operand in tree[1]:
+        for term in query_terms(operand):
+            if term not in terms:
+                terms.append(term)
+    return terms
+
+
+def evaluate(tree: Optional[Tuple], term_ids: Dict[str, Set[str]]) -> Set[str]:
+    """
+    Evaluate an expression tree as set operations over the listing IDs of each term.
+
+    Args:
+        tree (Optional[Tuple]): The expression tree.
+        term_ids (Dict[str, Set[str]]): Listing IDs matched by each term.
+
+    Returns:
+        Set[str]: Listing IDs matched by the whole expression.
+    """
+    if tree is None:
+        return set()
+    if tree[0] == "term":
+        return term_ids.get(tree[1], set())
+
+    sets = [evaluate(operand, term_ids) for operand in tree[1]]
+    if tree[0] == "and":
+        return set.intersection(*sets)
+    return set.union(*sets)
+
+
+class TermCache:
+    def __init__(self, ttl: float = TERM_CACHE_TTL, size: int = TERM_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        """
+        Get the cached listings of a search term.
+
+        Args:
+            key (Tuple): The cache key.
+
+        Returns:
+            Optional[List[Dict]]: The cached listings, or None if missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, listings = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return listings
+
+    def set(self, key: Tuple, listings: List[Dict]) -> None:
+        """
+        Cache the listings of a search term, evicting the least recently used term when full.
+
+        Args:
+            key (Tuple): The cache key.
+            listings (List[Dict]): The listings matched by the term.
+        """
+        with self.lock:
+            self.entries[key] = (time.monotonic(), listings)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+term_cache = TermCache()
+
+
+@profiled("query.search")
+def search(platform: str, query: str, fetch_term: Callable[[str], List[Dict]],
+           id_key: str = 'link', cache_key: Tuple = ()) -> List[Dict]:
+    """
+    Answer a boolean keyword query by fetching each distinct term once and combining the results locally.
+
+    Terms missing from the cache are fetched concurrently. Cached listings are shared between callers,
+    so the returned listings are copies that are safe to modify.
+
+    Args:
+        platform (str): The platform name, used to scope the cache.
+        query (str): The boolean keyword query.
+        fetch_term (Callable[[str], List[Dict]]): Fetches the listings matching a single term.
+        id_key (str): Listing key that identifies the same listing across terms.
+        cache_key (Tuple): Extra values the fetched listings depend on, such as search filters.
+
+    Returns:
+        List[Dict]: The listings matched by the query, in the order the terms were fetched.
+    """
+    tree = parse_query(query)
+    terms = query_terms(tree)
+
+    listings = {}
+    missing = []
+    for term in terms:
+        cached = term_cache.get((platform, term) + cache_key)
+        if cached is None:
+            missing.append(term)
+        else:
+            listings[term] = cached
+
+    logging.info(f"Query plan for {platform}: {len(terms)} terms, {len(missing)} to fetch")
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=TERM_FETCH_WORKERS) as executor:
+            for term, fetched in zip(missing, executor.map(propagate(fetch_term), missing)):
+                term_cache.set((platform, term) + cache_key, fetched)
+                listings[term] = fetched
+
+    term_ids = {term: {listing[id_key] for listing in listings[term]} for term in terms}
+    matched = evaluate(tree, term_ids)
+
+    results = []
+    seen = set()
+    for term in terms:
+        for listing in listings[term]:
+            listing_id = listing[id_key]
+            if listing_id in matched and listing_id not in seen:
+                seen.add(listing_id)
+                results.append(listing.copy())
+    return results
@@ -1,13 +1,19 @@
 import os
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
+from datetime import datetime
 
 from src.services.llm.llm import generate_rating, extract_keywords
 from src.services.rag.retriever import Retriever
-from src.config.config import COMPANY_DATA_QUERY
+from src.config.config import COMPANY_DATA_QUERY, SAM_PAGE_SIZE, SAM_MAX_RESULTS, SAM_URL
 from src.services.scrapers.scraper import Scraper
+from src.services.scrapers.query import search
+from src.services.scrapers.dedup import deduplicate
+from src.services.scrapers.opportunity import Opportunity
+from src.services.scrapers.index import opportunity_index
 from src.utils.utlils import semantic_similarity
-import requests
+from src.services.governor.governor import governor
+from src.services.profiling.profiling import profiled
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,60 +21,116 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
                             
 class SamScraper(Scraper):   
     
-    def __init__(self, user_id: str):
-        self.retriever = Retriever(user_id=user_id)
-        self.docs = self.retriever.get_query_docs(COMPANY_DATA_QUERY, k=1)
+    def __init__(self, user_id: str, retriever: Optional[Retriever] = None, docs: Optional[str] = None):
+        self.retriever = retriever or Retriever(user_id=user_id)
+        self.docs = docs or self.retriever.get_query_docs(COMPANY_DATA_QUERY, k=1)
+        self.ratings = {}
         
-    def scrape(self,user_id: str, keywords:str = None, rate: bool = False) -> List[Dict]:
+    @profiled("sam.scrape")
+    def scrape(self,user_id: str, keywords:str = None, rate: bool = False, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, mode: str = "remote") -> List[Opportunity]:
         """
-        Scrape the SAM website for opportunities matching the given keywords.
+        Scrape the SAM website for opportunities matching the given keywords and response date range.
+
+        In "remote" mode each term of the boolean keyword query is fetched once and cached, the query is
+        evaluated locally and the fetched opportunities are added to the local index. In "local" mode the
+        query is answered from the local index only, ranked by BM25.
 
         Args:
-            keywords (str): Keywords to search for in the opportunities.
+            keywords (str): Boolean keyword query, extracted from the company data if None.
             rate (bool): Whether to generate relevance ratings for the opportunities.
+            date_from (Optional[datetime]): Start date for the opportunity response date range.
+            date_to (Optional[datetime]): End date for the opportunity response date range.
+            mode (str): "remote" to search sam.gov, "local" to search the local index.
             
         Returns:
-            List[Dict]: List of dictionaries containing the scraped opportunity details.
+            List[Opportunity]: The scraped opportunities.
         """
-        results = []
-        
-
         if not keywords:
             keywords = self.retriever.get_keywords(max_length=5)
-        # keywords = keywords.replace('"', "")
-        # keywords = keywords.replace(" ", "%20")
         
         print(keywords)
 
-        # keywords = "technology or construction"        
-        # keywords = keywords.replace(" ", "%20")
+        index = opportunity_index()
+        if mode == "local":
+            results = index.search(keywords, platform="sam.gov", date_from=date_from, date_to=date_to)
+        else:
+            # The date range is sent with every request, so cached terms are scoped to it
+            results = search("sam.gov", keywords, lambda term: self.fetch_term(term, date_from, date_to),
+                             cache_key=(date_from, date_to))
+            index.add(results)
 
-        
-        for result in requests.get(f"https://sam.gov/api/prod/sgs/v1/search/?random=1712817914503&index=_all&page=0&mode=search&sort=-modifiedDate&size=10000&mfe=true&q={keywords}%0A&qMode=SEARCH_EDITOR&is_active=true").json()['_embedded']['results']:
-            title = result['title']
-            link = f"https://sam.gov/opp/{result['_id']}/view"
-            try:
-                if result['descriptions'] != []:
-                    description = result['descriptions'][0]["content"]
-                else:
-                    description = "No description available."
-            except KeyError:
-                if 'description' in result:
-                    description = result['description']
-                elif 'objectives' in result:
-                    description = result['objective']["content"]
-            if rate:
-                rating = semantic_similarity(self.docs, title + " " + description)
-            else:
-                rating = None
-            entry = {
-                'title': title,
-                'link': link,
-                'description': description,
-                'rating': rating
-            }
-            results.append(entry)
-        
+        results = deduplicate(results)
+
+        if rate:
+            self.score(results)
+        return results
+
+    @profiled("sam.fetch_term")
+    def fetch_term(self, term: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> List[Opportunity]:
+        """
+        Fetch the active SAM opportunities matching a single search term and response date range, without rating.
+
+        The active status and the date range are sent as search parameters, and results are read SAM_PAGE_SIZE
+        at a time until the last page, or until SAM_MAX_RESULTS have been read. Opportunities whose response
+        date is still outside the range are dropped.
+
+        Args:
+            term (str): The search term.
+            date_from (Optional[datetime]): Start date for the opportunity response date range.
+            date_to (Optional[datetime]): End date for the opportunity response date range.
+
+        Returns:
+            List[Opportunity]: The opportunities.
+        """
+        bounded = bool(date_from and date_to)
+        date_params = ""
+        if bounded:
+            date_params = f"&response_date.from={date_from:%Y-%m-%d}&response_date.to={date_to:%Y-%m-%d}"
+
+        results = []
+        page = read = 0
+        while True:
+            response = governor.get(f"{SAM_URL}/api/prod/sgs/v1/search/?random=1712817914503&index=_all&page={page}&mode=search&sort=-modifiedDate&size={SAM_PAGE_SIZE}&mfe=true&q={term}%0A&qMode=SEARCH_EDITOR&is_active=true{date_params}").json()
+            listings = response.get('_embedded', {}).get('results', [])
+            page += 1
+            last_page = len(listings) < SAM_PAGE_SIZE or page >= response.get('page', {}).get('totalPages', page)
+
+            listings = listings[:SAM_MAX_RESULTS - read]
+            read += len(listings)
+
+            for result in listings:
+                title = result['title']
+                link = f"{SAM_URL}/opp/{result['_id']}/view"
+                try:
+                    if result['descriptions'] != []:
+                        description = result['descriptions'][0]["content"]
+                    else:
+                        description = "No description available."
+                except KeyError:
+                    if 'description' in result:
+                        description = result['description']
+                    elif 'objectives' in result:
+                        description = result['objective']["content"]
+                response_date = result.get('responseDate')
+                entry = Opportunity(
+                    platform="sam.gov",
+                    title=title,
+                    link=link,
+                    description=description,
+                    status="active",
+                    close_date=f"{response_date[5:7]}-{response_date[8:10]}-{response_date[:4]}" if response_date else None,
+                )
+                if bounded and not entry.closes_between(date_from, date_to):
+                    continue
+                results.append(entry)
+
+            if last_page:
+                break
+            if read >= SAM_MAX_RESULTS:
+                logging.warning(f"Stopped at {read} sam.gov results for {term}, later pages were not fetched")
+                break
+
+        logging.info(f"Fetched {page} pages of sam.gov results for {term}")
         return results
        
     def parse(self, html: str, user_id: str, rate: bool = False) -> List[Dict]:
@@ -1,106 +1,229 @@
 import os
+import re
 import logging
 from typing import List, Dict, Optional
 import bs4
 
 from datetime import datetime
+from urllib.parse import urlparse
 
 from src.services.llm.llm import generate_rating
 from src.services.rag.retriever import Retriever
-from src.config.config import COMPANY_DATA_QUERY
+from src.config.config import COMPANY_DATA_QUERY, SBIR_PAGE_WORKERS, SBIR_URL
 from src.services.scrapers.scraper import Scraper
+from src.services.scrapers.query import search
+from src.services.scrapers.dedup import deduplicate
+from src.services.scrapers.opportunity import Opportunity
+from src.services.scrapers.index import opportunity_index
 
 from src.utils.utlils import semantic_similarity
 
-import requests
-import threading
+from src.services.governor.governor import governor
+from src.services.profiling.profiling import profiled, propagate
+from concurrent.futures import ThreadPoolExecutor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
+CLOSE_DATE_PATTERN = re.compile(r'solr-search-close-date[^>]*>[^<]*?(\d{2}-\d{2}-\d{4})')
+
+
+def page_close_dates(html: str) -> List[datetime]:
+    """
+    Extract the close dates of a result page in listing order, without parsing the whole page.
+
+    Args:
+        html (str): HTML content of the page.
+
+    Returns:
+        List[datetime]: The close dates.
+    """
+    return [datetime.strptime(value, '%m-%d-%Y') for value in CLOSE_DATE_PATTERN.findall(html)]
+
+
+def date_order(dates: List[datetime]) -> Optional[str]:
+    """
+    Detect whether a sequence of dates is sorted. Dates that are all equal show no order, so at least two
+    distinct dates are needed.
+
+    Args:
+        dates (List[datetime]): The dates.
+
+    Returns:
+        Optional[str]: "asc" or "desc", or None if the dates are unsorted or have fewer than two distinct values.
+    """
+    if len(set(dates)) < 2:
+        return None
+    for direction in ("asc", "desc"):
+        if is_ordered(dates, direction):
+            return direction
+    return None
+
+
+def is_ordered(dates: List[datetime], direction: str) -> bool:
+    """
+    Check whether a sequence of dates follows an order.
+
+    Args:
+        dates (List[datetime]): The dates.
+        direction (str): "asc" or "desc".
+
+    Returns:
+        bool: Whether the dates are sorted in that direction.
+    """
+    pairs = zip(dates, dates[1:])
+    if direction == "asc":
+        return all(a <= b for a, b in pairs)
+    return all(a >= b for a, b in pairs)
+
+
+def past_range(dates: List[datetime], direction: str, date_from: datetime, date_to: datetime) -> bool:
+    """
+    Check whether a page of ordered close dates lies wholly past a date range, so later pages do too.
+
+    Args:
+        dates (List[datetime]): The close dates of the page.
+        direction (str): "asc" or "desc".
+        date_from (datetime): Start of the range.
+        date_to (datetime): End of the range.
+
+    Returns:
+        bool: Whether every later page falls outside the range.
+    """
+    if not dates:
+        return False
+    if direction == "asc":
+        return min(dates) > date_to
+    return max(dates) < date_from
+
+
 class SbirScraper(Scraper):
     
-    def __init__(self, user_id: str):
-        self.retierver = Retriever(user_id=user_id)
-        self.docs = self.retierver.get_query_docs(COMPANY_DATA_QUERY, k=1)
+    def __init__(self, user_id: str, retriever: Optional[Retriever] = None, docs: Optional[str] = None):
+        self.retriever = retriever or Retriever(user_id=user_id)
+        self.docs = docs or self.retriever.get_query_docs(COMPANY_DATA_QUERY, k=1)
+        self.ratings = {}
         
         
-    def scrape(self, user_id: str, keywords:str = None, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, rate: bool = False) -> List[Dict]:
+    @profiled("sbir.scrape")
+    def scrape(self, user_id: str, keywords:str = None, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, rate: bool = False, mode: str = "remote") -> List[Opportunity]:
         """
         Scrape SBIR website for proposals matching the given keywords and date range.
 
+        In "remote" mode each term of the boolean keyword query is fetched once and cached, the query is
+        evaluated locally and the fetched proposals are added to the local index. In "local" mode the query
+        is answered from the local index only, ranked by BM25.
+
         Args:
+            keywords (str): Boolean keyword query, extracted from the company data if None.
             date_from (Optional[datetime]): Start date for the proposal closing date range.
             date_to (Optional[datetime]): End date for the proposal closing date range.
             rate (bool): Whether to generate relevance ratings for the proposals.
+            mode (str): "remote" to search sbir.gov, "local" to search the local index.
         Returns:
-            List[Dict]: List of dictionaries containing the scraped proposal details.
+            List[Opportunity]: The scraped proposals.
         """
         try:
-            # Create a lock to synchronize access to the global list
-            lock = threading.Lock()
-
-            # Define a function to be executed by each thread
-            def process_link(link):
-                # Perform the HTTP request
-                response = requests.get(link)
-                
-                # Call the parse function and get the results
-                parsed_results = self.parse(response.text, user_id, date_from, date_to, rate=rate)
-                
-                # Acquire the lock to safely update the global list
-                with lock:
-                    # Append the results to the global list
-                    results.extend(parsed_results)
-                    
-            # Create a list to store the thread objects
-            threads = []
-            
             if not keywords:
                 keywords = self.retriever.get_keywords(max_length=3)
                 keywords = keywords.replace('"', "")
             
             print(keywords)
             
-            url_extension = keywords.replace(" ", "%2520")
-            url = f"https://www.sbir.gov/sbirsearch/topic/current/{url_extension}"
-            
-            html = requests.get(url).text
-            
-            # Parse and process the results
-            results = []
-            page_num = 1
-            logging.info(f"Scraping page {page_num}")
-            results.extend(self.parse(html, user_id, date_from, date_to, rate=rate))
-
-            soup = bs4.BeautifulSoup(html, 'html.parser')
-            next_button = soup.find(class_="next")
-            if next_button:
-                ul_element = soup.find("ul", class_="pagination")
-                pages_urls = []
-                for li_element in ul_element.find_all("li")[:-2]:
-                    a_element = li_element.find("a")
-                    if a_element is not None:
-                        pages_urls.append("https://www.sbir.gov"+a_element["href"])
-                # Create and start a thread for each link in pages_urls
-                for link in pages_urls:
-                    thread = threading.Thread(target=process_link, args=(link,))
-                    thread.start()
-                    threads.append(thread)
-                # Wait for all threads to complete
-                for thread in threads:
-                    thread.join()
-                    
+            index = opportunity_index()
+            if mode == "local":
+                results = index.search(keywords, platform="sbir.gov", date_from=date_from, date_to=date_to)
+            else:
+                # The date range is applied while fetching, so cached terms are scoped to it
+                results = search("sbir.gov", keywords, lambda term: self.fetch_term(term, date_from, date_to),
+                                 cache_key=(date_from, date_to))
+                index.add(results)
+
+            results = deduplicate(results)
+
             if rate:
-                results.sort(key=lambda x: x['rating'], reverse=True)
+                self.score(results)
             return results
 
         except Exception as e:
             logging.error(f"Error scraping SBIR website: {e}")
             return []
 
-    def parse(self, html: str, user_id:str, date_from: Optional[datetime], date_to: Optional[datetime], rate:bool=False) -> List[Dict]:
+    @profiled("sbir.fetch_term")
+    def fetch_term(self, term: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> List[Opportunity]:
+        """
+        Fetch the SBIR proposals matching a single search term and closing date range, without rating.
+
+        The current-topics listing only holds open proposals, so status needs no filtering. Without a date
+        range every page is fetched at once. With a date range, pages are fetched SBIR_PAGE_WORKERS at a time
+        while the close dates come back ordered, and fetching stops at the first page after page 1 that lies
+        wholly past the range.
+
+        Args:
+            term (str): The search term.
+            date_from (Optional[datetime]): Start date for the proposal closing date range.
+            date_to (Optional[datetime]): End date for the proposal closing date range.
+
+        Returns:
+            List[Opportunity]: The proposals.
+        """
+        url_extension = term.replace(" ", "%2520")
+        url = f"{SBIR_URL}/sbirsearch/topic/current/{url_extension}"
+        
+        html = governor.get(url).text
+        
+        # Parse and process the results
+        logging.info(f"Scraping page 1 for {term}")
+        results = self.parse(html, None, date_from, date_to)
+
+        pages_urls = []
+        soup = bs4.BeautifulSoup(html, 'html.parser')
+        next_button = soup.find(class_="next")
+        if next_button:
+            ul_element = soup.find("ul", class_="pagination")
+            for li_element in ul_element.find_all("li")[:-2]:
+                a_element = li_element.find("a")
+                if a_element is not None:
+                    pages_urls.append(SBIR_URL+a_element["href"])
+
+        # The search doesn't ask for any order, so it is inferred from page 1 and checked on every later
+        # page. Page 1 alone never ends the search.
+        bounded = bool(date_from and date_to)
+        close_dates = page_close_dates(html)
+        direction = date_order(close_dates) if bounded else None
+
+        # Pages whose order is unknown are all fetched in one wave
+        wave_size = SBIR_PAGE_WORKERS if direction is not None else max(len(pages_urls), 1)
+        fetched = 1
+        with ThreadPoolExecutor(max_workers=wave_size) as executor:
+            for i in range(0, len(pages_urls), wave_size):
+                wave = pages_urls[i:i + wave_size]
+                stop = False
+                for page_html in executor.map(propagate(lambda link: governor.get(link).text), wave):
+                    fetched += 1
+                    results.extend(self.parse(page_html, None, date_from, date_to))
+
+                    if direction is not None:
+                        page_dates = page_close_dates(page_html)
+                        if not is_ordered(close_dates[-1:] + page_dates, direction):
+                            # The pages are not ordered by close date after all, fetch the rest unfiltered
+                            direction = None
+                        elif past_range(page_dates, direction, date_from, date_to):
+                            stop = True
+                            break
+                        close_dates.extend(page_dates)
+                if stop:
+                    break
+
+        logging.info(f"Fetched {fetched} of {len(pages_urls) + 1} pages for {term}")
+
+        if governor.is_degraded(urlparse(SBIR_URL).netloc):
+            logging.warning(f"{SBIR_URL} is degraded, results for {term} may be incomplete")
+        return results
+
+    @profiled("sbir.parse")
+    def parse(self, html: str, user_id:str, date_from: Optional[datetime], date_to: Optional[datetime], rate:bool=False) -> List[Opportunity]:
         """
         Parse the HTML content from the SBIR website and extract proposal details.
 
@@ -111,7 +234,7 @@ class SbirScraper(Scraper):
             rate (bool): Whether to generate relevance ratings for the proposals.
 
         Returns:
-            List[Dict]: List of dictionaries containing the parsed proposal details.
+            List[Opportunity]: The parsed proposals.
         """
         soup = bs4.BeautifulSoup(html, 'html.parser')
 
@@ -127,7 +250,7 @@ class SbirScraper(Scraper):
                     continue
 
             title = li.find('h3', class_='title').text
-            link = 'https://www.sbir.gov' + li.find('a')['href']
+            link = SBIR_URL + li.find('a')['href']
             open_date = li.find('span', class_='solr-search-open-date').text.split(' ')[-1]
             release_date = li.find('span', class_='solr-search-release-date').text.split(' ')[-1]
             due_date = li.find('span', class_='solr-search-due-date')
@@ -143,21 +266,23 @@ class SbirScraper(Scraper):
             else:
                 rating = None
 
-            entry = {
-                'title': title,
-                'link': link,
-                'open_date': open_date,
-                'release_date': release_date,
-                'due_date': due_date,
-                'close_date': close_date.date().__format__('%m-%d-%Y'),
-                'description': description,
-                'rating': rating
-            }
+            entry = Opportunity(
+                platform="sbir.gov",
+                title=title,
+                link=link,
+                description=description,
+                rating=rating,
+                status="open",
+                open_date=open_date,
+                release_date=release_date,
+                due_date=due_date,
+                close_date=close_date.date().__format__('%m-%d-%Y'),
+            )
             results.append(entry)
 
         return results
 
-    def rate(proposals: List[Dict], company_data: str) -> List[Dict]:
+    def rate(proposals: List[Dict], company_data: str) -> List[Opportunity]:
         """
         Generate relevance ratings for a list of SBIR proposals based on the provided company data.
 
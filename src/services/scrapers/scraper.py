@@ -1,6 +1,10 @@
 import abc
 from typing import List, Dict
 
+from src.services.scrapers.opportunity import Opportunity, OpportunityBatch
+from src.services.profiling.profiling import profiled
+from src.utils.utlils import semantic_similarity
+
 class Scraper(abc.ABC):
     @abc.abstractmethod
     def scrape(self, keywords: str, user_id: str, rate: bool = False) -> List[Dict]:
@@ -44,4 +48,32 @@ class Scraper(abc.ABC):
         Returns:
             List[Dict]: List of dictionaries containing the proposals with relevance ratings
         """
-        pass
\ No newline at end of file
+        pass
+
+    @profiled("scraper.score")
+    def score(self, proposals: List[Opportunity]) -> List[Opportunity]:
+        """
+        Rate deduplicated proposals by semantic similarity to the company data.
+
+        Ratings are remembered per link, so proposals seen again in later scrapes with the same
+        scraper are not rated twice. Variants share the rating of their representative.
+
+        Args:
+            proposals (List[Opportunity]): The proposals to rate.
+
+        Returns:
+            List[Opportunity]: The proposals with relevance ratings, sorted by rating.
+        """
+        batch = OpportunityBatch(proposals)
+
+        ratings = []
+        for proposal, text in zip(proposals, batch.texts()):
+            if proposal.link not in self.ratings:
+                self.ratings[proposal.link] = semantic_similarity(self.docs, text)
+            ratings.append(self.ratings[proposal.link])
+            for variant in proposal.variants:
+                variant['rating'] = self.ratings[proposal.link]
+        batch.set_ratings(ratings)
+
+        proposals[:] = batch.ranked()
+        return proposals
@@ -0,0 +1,70 @@
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import List, Optional
+
+from src.config.config import COMPANY_DATA_QUERY
+from src.services.rag.retriever import Retriever
+from src.services.scrapers.dedup import deduplicate
+from src.services.scrapers.opportunity import Opportunity
+from src.services.scrapers.sbir import SbirScraper
+from src.services.scrapers.samgov import SamScraper
+from src.services.profiling.profiling import profiled, propagate
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+@profiled("search_all")
+def search_all(user_id: str, keywords: Optional[str] = None, date_from: Optional[datetime] = None,
+               date_to: Optional[datetime] = None, top_k: int = 100, mode: str = "remote") -> List[Opportunity]:
+    """
+    Search sbir.gov and sam.gov concurrently and merge the rated results.
+
+    Both scrapers share one company profile and one keyword query. Each platform is fully scraped and
+    rated, then their rating-sorted results are merged and cut to the best top_k. Near-duplicates found
+    across platforms are collapsed, so fewer than top_k opportunities may be returned. A platform that
+    fails is logged and skipped, so the results of the other platform are still returned.
+
+    Args:
+        user_id (str): The user ID.
+        keywords (Optional[str]): Boolean keyword query, extracted from the company data if None.
+        date_from (Optional[datetime]): Start date for the closing date range.
+        date_to (Optional[datetime]): End date for the closing date range.
+        top_k (int): Maximum number of opportunities to return.
+        mode (str): "remote" to search both platforms, "local" to search the local index.
+
+    Returns:
+        List[Opportunity]: The opportunities of both platforms, sorted by rating.
+    """
+    retriever = Retriever(user_id=user_id)
+    docs = retriever.get_query_docs(COMPANY_DATA_QUERY, k=1)
+
+    if not keywords:
+        keywords = retriever.get_keywords(max_length=5).replace('"', "")
+
+    sbir = SbirScraper(user_id, retriever=retriever, docs=docs)
+    sam = SamScraper(user_id, retriever=retriever, docs=docs)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = {
+            platform: executor.submit(propagate(scraper.scrape), user_id=user_id, keywords=keywords, date_from=date_from,
+                                      date_to=date_to, rate=True, mode=mode)
+            for platform, scraper in (("sbir.gov", sbir), ("sam.gov", sam))
+        }
+
+        results = {}
+        for platform, future in futures.items():
+            try:
+                results[platform] = future.result()
+            except Exception as e:
+                logging.error(f"Error searching {platform}, returning the other platform's results: {e}")
+                results[platform] = []
+    sbir_results, sam_results = results["sbir.gov"], results["sam.gov"]
+
+    logging.info(f"Merging {len(sbir_results)} sbir.gov and {len(sam_results)} sam.gov results")
+
+    merged = heapq.merge(sbir_results, sam_results, key=lambda x: x.rating, reverse=True)
+    return deduplicate(list(islice(merged, top_k)))
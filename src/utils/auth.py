@@ -0,0 +1,35 @@
+import hashlib
+import hmac
+from typing import Optional
+
+from src.config.creds import USER_TOKEN_SECRET
+
+
+def user_token(user_id: str) -> Optional[str]:
+    """
+    Sign a user ID, so endpoints can check that the caller is that user.
+
+    Args:
+        user_id (str): The user ID.
+
+    Returns:
+        Optional[str]: The token, or None if USER_TOKEN_SECRET is not configured.
+    """
+    if not USER_TOKEN_SECRET:
+        return None
+    return hmac.new(USER_TOKEN_SECRET.encode(), user_id.encode(), hashlib.sha256).hexdigest()
+
+
+def is_user(user_id: str, token: Optional[str]) -> bool:
+    """
+    Check a token against the one issued to a user. Always fails when no secret is configured.
+
+    Args:
+        user_id (str): The user ID.
+        token (Optional[str]): The token sent with the request.
+
+    Returns:
+        bool: Whether the token was issued to the user.
+    """
+    expected = user_token(user_id)
+    return expected is not None and token is not None and hmac.compare_digest(token, expected)
@@ -0,0 +1,180 @@
+import gzip
+import logging
+from typing import Any, Dict, List, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+from src.config.config import COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def compact_results(results: List[Dict], fields: Optional[List[str]] = None, description_length: Optional[int] = None,
+                    limit: Optional[int] = None, offset: int = 0, sort: bool = False) -> List[Dict]:
+    """
+    Reduce a list of scraped results to the requested window and fields.
+
+    Args:
+        results (List[Dict]): The scraped results.
+        fields (Optional[List[str]]): Keys to keep in every result, all keys are kept if None.
+        description_length (Optional[int]): Maximum description length, 0 drops the description entirely.
+        limit (Optional[int]): Maximum number of results to return, all results are returned if None.
+        offset (int): Number of results to skip.
+        sort (bool): Whether to sort the results by rating before windowing.
+
+    Returns:
+        List[Dict]: The compacted results.
+    """
+    if sort:
+        results = sorted(results, key=lambda x: x['rating'] or 0, reverse=True)
+
+    end = None if limit is None else offset + limit
+    window = results[offset:end]
+
+    if fields is None and description_length is None:
+        return window
+
+    compacted = []
+    for result in window:
+        if fields is not None:
+            result = {key: result[key] for key in fields if key in result}
+        else:
+            result = dict(result)
+
+        if description_length is not None and 'description' in result:
+            if description_length == 0:
+                del result['description']
+            else:
+                result['description'] = result['description'][:description_length]
+        compacted.append(result)
+
+    return compacted
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header into a mapping of encoding to quality value.
+
+    Args:
+        accept_encoding (str): The raw header value.
+
+    Returns:
+        Dict[str, float]: The accepted encodings and their q values.
+    """
+    encodings = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def encode_body(body: bytes, accept_encoding: str) -> tuple:
+    """
+    Compress a response body with the best encoding the client accepts.
+
+    Brotli is preferred over gzip when the brotli package is installed.
+
+    Args:
+        body (bytes): The uncompressed body.
+        accept_encoding (str): The client's Accept-Encoding header.
+
+    Returns:
+        tuple: The (possibly compressed) body and the content encoding, or None if uncompressed.
+    """
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return body, None
+
+    encodings = _accepted_encodings(accept_encoding)
+    if brotli is not None and encodings.get('br', 0) > 0:
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    if encodings.get('gzip', 0) > 0:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+    return body, None
+
+
+def json_response(content: Any, request: Request) -> Response:
+    """
+    Serialize content with orjson and compress it according to the request's Accept-Encoding.
+
+    Args:
+        content (Any): The JSON-serializable content.
+        request (Request): The incoming request.
+
+    Returns:
+        Response: The encoded JSON response.
+    """
+    body, encoding = encode_body(orjson.dumps(content), request.headers.get('accept-encoding', ''))
+
+    headers = {'Vary': 'Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    Format a server-sent event with a JSON payload.
+
+    Args:
+        event (str): The event name.
+        data (Any): The JSON-serializable payload.
+
+    Returns:
+        str: The encoded event.
+    """
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+# Example usage
+if __name__ == "__main__":
+    import json
+    import random
+    import time
+
+    words = ["technology", "construction", "research", "defense", "energy", "software", "manufacturing", "support"]
+    results = [
+        {
+            'title': " ".join(random.choices(words, k=8)),
+            'link': f"https://sam.gov/opp/{i:032x}/view",
+            'description': " ".join(random.choices(words, k=400)),
+            'rating': random.randint(0, 100),
+        }
+        for i in range(10000)
+    ]
+
+    def measure(name, content):
+        start = time.perf_counter()
+        stdlib_body = json.dumps(content).encode()
+        stdlib_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        body = orjson.dumps(content)
+        orjson_time = time.perf_counter() - start
+
+        print(f"{name}: stdlib json {len(stdlib_body)} bytes in {stdlib_time * 1000:.1f} ms, "
+              f"orjson {len(body)} bytes in {orjson_time * 1000:.1f} ms")
+        for accept in ('gzip', 'br'):
+            start = time.perf_counter()
+            encoded, encoding = encode_body(body, accept)
+            print(f"    {encoding}: {len(encoded)} bytes in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    measure("full", results)
+    measure("title/link/rating", compact_results(results, fields=['title', 'link', 'rating'], sort=True))
+    measure("description[:200], top 100", compact_results(results, description_length=200, limit=100, sort=True))